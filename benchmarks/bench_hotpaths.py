@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Microbenchmarks for the model and preprocessing hot paths.
+
+Measures:
+  - CatsDogsCNN forward latency and throughput per batch size and thread count
+  - get_transforms(augment=False) cost per image for several input resolutions
+  - end-to-end in-process /predict time through TestClient
+
+Usage:
+  python benchmarks/bench_hotpaths.py run --output bench.json
+  python benchmarks/bench_hotpaths.py run --quick
+  python benchmarks/bench_hotpaths.py compare bench.json baseline.json --threshold 0.1
+
+Also runnable under pytest: pytest benchmarks/
+"""
+
+import argparse
+import io
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import torch
+from PIL import Image
+
+from src.model import get_model
+from src.data_preprocessing import get_transforms
+from src.benchmarking import (
+    time_function, latency_summary, environment_metadata, write_report, load_report,
+    compare_reports, print_comparison
+)
+
+BATCH_SIZES = (1, 8, 32)
+THREAD_COUNTS = (1, 2, 4)
+RESOLUTIONS = (224, 512, 1024, 2048)
+
+# Metric suffixes checked by `compare` unless --all-metrics is given
+COMPARED_SUFFIXES = ("p50_ms", "throughput")
+
+
+def bench_model_forward(batch_sizes=BATCH_SIZES, thread_counts=THREAD_COUNTS, repeats=10):
+    """Forward pass latency and images/s for each batch size and thread count."""
+    metrics = {}
+    model = get_model(num_classes=2).eval()
+    original_threads = torch.get_num_threads()
+    try:
+        for threads in thread_counts:
+            torch.set_num_threads(threads)
+            for batch_size in batch_sizes:
+                inputs = torch.randn(batch_size, 3, 224, 224)
+
+                def forward():
+                    with torch.no_grad():
+                        model(inputs)
+
+                timings = time_function(forward, repeats=repeats, warmup=2)
+                prefix = f"model_forward_b{batch_size}_t{threads}_"
+                summary = latency_summary(timings, prefix=prefix)
+                metrics[f"{prefix}p50_ms"] = summary[f"{prefix}p50_ms"]
+                metrics[f"{prefix}p90_ms"] = summary[f"{prefix}p90_ms"]
+                metrics[f"{prefix}throughput"] = batch_size / (summary[f"{prefix}p50_ms"] / 1000)
+    finally:
+        torch.set_num_threads(original_threads)
+    return metrics
+
+
+def bench_transforms(resolutions=RESOLUTIONS, repeats=20):
+    """Per-image cost of the inference transform for several input sizes."""
+    metrics = {}
+    transform = get_transforms(augment=False)
+    for resolution in resolutions:
+        image = Image.new('RGB', (resolution, resolution), color='red')
+        timings = time_function(lambda: transform(image), repeats=repeats)
+        prefix = f"transform_{resolution}_"
+        summary = latency_summary(timings, prefix=prefix)
+        metrics[f"{prefix}p50_ms"] = summary[f"{prefix}p50_ms"]
+        metrics[f"{prefix}p90_ms"] = summary[f"{prefix}p90_ms"]
+    return metrics
+
+
+def bench_predict_endpoint(resolution=224, repeats=20):
+    """End-to-end /predict time in process, including multipart and JPEG decode."""
+    from fastapi.testclient import TestClient
+    from src.inference import app, load_model
+
+    load_model()
+    client = TestClient(app)
+    img_bytes = io.BytesIO()
+    Image.new('RGB', (resolution, resolution), color='red').save(img_bytes, format='JPEG')
+    payload = img_bytes.getvalue()
+
+    def predict():
+        response = client.post("/predict", files={"file": ("bench.jpg", payload, "image/jpeg")})
+        assert response.status_code == 200, response.text
+
+    timings = time_function(predict, repeats=repeats)
+    summary = latency_summary(timings, prefix="predict_endpoint_")
+    return {key: value for key, value in summary.items() if key.endswith(("p50_ms", "p90_ms", "p99_ms"))}
+
+
+def run_benchmarks(quick=False):
+    """Run every benchmark and return a report dict."""
+    if quick:
+        metrics = bench_model_forward(batch_sizes=(1, 4), thread_counts=(1,), repeats=3)
+        metrics.update(bench_transforms(resolutions=(224, 1024), repeats=5))
+        metrics.update(bench_predict_endpoint(repeats=5))
+    else:
+        metrics = bench_model_forward()
+        metrics.update(bench_transforms())
+        metrics.update(bench_predict_endpoint())
+    return {
+        "benchmark": "hotpaths",
+        "config": {"quick": quick},
+        "environment": environment_metadata(),
+        "metrics": metrics,
+    }
+
+
+def compare(current_path, baseline_path, threshold, all_metrics=False):
+    """Compare two reports, return True when nothing regressed."""
+    current, baseline = load_report(current_path), load_report(baseline_path)
+    metrics = set(current["metrics"]) & set(baseline["metrics"])
+    thresholds = {
+        metric: threshold for metric in metrics
+        if all_metrics or metric.endswith(COMPARED_SUFFIXES)
+    }
+    return print_comparison(compare_reports(current, baseline, thresholds))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Model and preprocessing microbenchmarks")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="Run benchmarks")
+    run_parser.add_argument("--output", default="bench_results.json", help="JSON report path")
+    run_parser.add_argument("--quick", action="store_true", help="Fewer configurations and repeats")
+
+    compare_parser = subparsers.add_parser("compare", help="Compare a report against a baseline")
+    compare_parser.add_argument("current", help="Current JSON report")
+    compare_parser.add_argument("baseline", help="Baseline JSON report")
+    compare_parser.add_argument("--threshold", type=float, default=0.10,
+                                help="Allowed relative regression (default 0.10)")
+    compare_parser.add_argument("--all-metrics", action="store_true",
+                                help="Also compare p90 metrics, not just p50 and throughput")
+
+    args = parser.parse_args(argv)
+    if args.command == "run":
+        report = run_benchmarks(quick=args.quick)
+        for name, value in sorted(report["metrics"].items()):
+            print(f"{name:<40} {value:>12.3f}")
+        write_report(report, args.output)
+        print(f"\nReport written to {args.output}")
+        return 0
+
+    if not compare(args.current, args.baseline, args.threshold, args.all_metrics):
+        print("\n✗ Performance regression detected")
+        return 1
+    print("\n✓ No regression against baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,36 @@
+"""Run the hot path benchmarks under pytest: pytest benchmarks/ -s"""
+import json
+
+from benchmarks.bench_hotpaths import (
+    bench_model_forward, bench_transforms, bench_predict_endpoint, compare, main
+)
+
+def test_bench_model_forward():
+    """Benchmark forward pass for small batches on one thread."""
+    metrics = bench_model_forward(batch_sizes=(1, 4), thread_counts=(1,), repeats=3)
+
+    assert metrics["model_forward_b1_t1_p50_ms"] > 0
+    assert metrics["model_forward_b4_t1_throughput"] > 0
+
+def test_bench_transforms():
+    """Benchmark inference transform for two resolutions."""
+    metrics = bench_transforms(resolutions=(224, 1024), repeats=3)
+
+    assert metrics["transform_224_p50_ms"] > 0
+    assert metrics["transform_1024_p50_ms"] > 0
+
+def test_bench_predict_endpoint():
+    """Benchmark in-process /predict."""
+    metrics = bench_predict_endpoint(repeats=3)
+
+    assert metrics["predict_endpoint_p50_ms"] > 0
+
+def test_compare_detects_regression(tmp_path):
+    """Check compare flags a slowdown against a saved baseline."""
+    baseline = tmp_path / "baseline.json"
+    current = tmp_path / "current.json"
+    baseline.write_text(json.dumps({"metrics": {"transform_224_p50_ms": 1.0, "transform_224_p90_ms": 1.0}}))
+    current.write_text(json.dumps({"metrics": {"transform_224_p50_ms": 2.0, "transform_224_p90_ms": 2.0}}))
+
+    assert not compare(str(current), str(baseline), threshold=0.1)
+    assert main(["compare", str(baseline), str(baseline)]) == 0
@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""
+Load test and latency benchmark for the inference service.
+
+Builds on smoke_tests.py: waits for the service the same way, then drives
+/predict with a configurable mix of image sizes and reports throughput,
+latency percentiles and error rates as JSON.
+
+Modes:
+  closed - N workers each send the next request as soon as the last returns
+  open   - requests are issued at a fixed arrival rate regardless of how fast
+           the service answers; latency is measured from the scheduled send
+           time so queueing delay is not hidden (no coordinated omission)
+
+Examples:
+  # Start a local server and run a 30s closed-loop test with 8 workers
+  python load_test.py --start-server --mode closed --concurrency 8 --duration 30
+
+  # Open-loop at 20 req/s against a running service, compare to a baseline
+  python load_test.py --url http://localhost:8000 --mode open --rate 20 \\
+      --output report.json --baseline baseline.json
+"""
+
+import argparse
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from smoke_tests import make_test_image, wait_for_service
+from src.benchmarking import (
+    latency_summary, environment_metadata, write_report, load_report,
+    compare_reports, print_comparison
+)
+
+DEFAULT_THRESHOLDS = {"rps": 0.10, "p50_ms": 0.15, "p99_ms": 0.25, "error_rate": 0.0}
+
+
+def parse_size_mix(spec):
+    """Parse '224:0.6,512:0.3,1024:0.1' into [(224, 0.6), ...]."""
+    mix = []
+    for item in spec.split(","):
+        size, _, weight = item.partition(":")
+        mix.append((int(size), float(weight or 1)))
+    return mix
+
+
+def build_payloads(size_mix):
+    """Encode one JPEG per size up front so the client does no image work."""
+    return {size: make_test_image((size, size), color='red').getvalue() for size, _ in size_mix}
+
+
+class Recorder:
+    """Thread-safe collection of per-request results."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.results = []
+
+    def add(self, size, latency, status):
+        with self._lock:
+            self.results.append((size, latency, status))
+
+
+def send_request(session, url, payload, timeout):
+    """POST one image and return the HTTP status, 0 on connection errors."""
+    try:
+        response = session.post(url, files={'file': ('load.jpg', payload, 'image/jpeg')}, timeout=timeout)
+        return response.status_code
+    except requests.exceptions.RequestException:
+        return 0
+
+
+def run_closed_loop(url, payloads, sizes, weights, args, recorder, deadline):
+    """Each worker sends back-to-back requests until the deadline."""
+    def worker():
+        session = requests.Session()
+        rng = random.Random()
+        while time.perf_counter() < deadline:
+            size = rng.choices(sizes, weights)[0]
+            start = time.perf_counter()
+            status = send_request(session, url, payloads[size], args.timeout)
+            recorder.add(size, time.perf_counter() - start, status)
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(args.concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def run_open_loop(url, payloads, sizes, weights, args, recorder, deadline):
+    """Issue requests on a fixed schedule, independent of response times."""
+    local = threading.local()
+    rng = random.Random()
+
+    def fire(size, scheduled):
+        if not hasattr(local, "session"):
+            local.session = requests.Session()
+        status = send_request(local.session, url, payloads[size], args.timeout)
+        recorder.add(size, time.perf_counter() - scheduled, status)
+
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        next_send = time.perf_counter()
+        while next_send < deadline:
+            delay = next_send - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(fire, rng.choices(sizes, weights)[0], next_send)
+            gap = 1.0 / args.rate
+            next_send += rng.expovariate(args.rate) if args.arrival == "poisson" else gap
+
+
+def summarize(results, elapsed):
+    """Compute throughput, error rates and latency percentiles."""
+    total = len(results)
+    ok = [latency for _, latency, status in results if status == 200]
+    shed = sum(1 for _, _, status in results if status in (429, 503))
+    metrics = {
+        "requests": total,
+        "duration_s": elapsed,
+        "rps": len(ok) / elapsed if elapsed else 0.0,
+        "error_rate": (total - len(ok)) / total if total else 0.0,
+        "shed_rate": shed / total if total else 0.0,
+    }
+    metrics.update(latency_summary(ok))
+
+    per_size = {}
+    for size in sorted({size for size, _, _ in results}):
+        latencies = [latency for s, latency, status in results if s == size and status == 200]
+        per_size[str(size)] = {"requests": sum(1 for s, _, _ in results if s == size)}
+        per_size[str(size)].update(latency_summary(latencies))
+    return metrics, per_size
+
+
+def run_load_test(args):
+    """Run warmup plus the measured phase and return a report dict."""
+    url = f"{args.url.rstrip('/')}{args.endpoint}"
+    size_mix = parse_size_mix(args.image_sizes)
+    sizes = [size for size, _ in size_mix]
+    weights = [weight for _, weight in size_mix]
+    payloads = build_payloads(size_mix)
+    runner = run_open_loop if args.mode == "open" else run_closed_loop
+
+    if args.warmup > 0:
+        print(f"Warming up for {args.warmup}s...")
+        runner(url, payloads, sizes, weights, args, Recorder(), time.perf_counter() + args.warmup)
+
+    print(f"Running {args.mode}-loop load test for {args.duration}s against {url}")
+    recorder = Recorder()
+    start = time.perf_counter()
+    runner(url, payloads, sizes, weights, args, recorder, start + args.duration)
+    elapsed = time.perf_counter() - start
+
+    metrics, per_size = summarize(recorder.results, elapsed)
+    return {
+        "benchmark": "load_test",
+        "config": {
+            "url": url,
+            "mode": args.mode,
+            "concurrency": args.concurrency,
+            "rate": args.rate if args.mode == "open" else None,
+            "arrival": args.arrival if args.mode == "open" else None,
+            "duration_s": args.duration,
+            "image_sizes": args.image_sizes,
+        },
+        "environment": environment_metadata(),
+        "metrics": metrics,
+        "per_size": per_size,
+    }
+
+
+def start_local_server(port):
+    """Start uvicorn on the local app without Docker."""
+    cmd = [sys.executable, "-m", "uvicorn", "src.inference:app", "--host", "127.0.0.1", "--port", str(port)]
+    print(f"Starting local server: {' '.join(cmd)}")
+    return subprocess.Popen(cmd, cwd=os.path.dirname(os.path.abspath(__file__)))
+
+
+def parse_thresholds(items):
+    thresholds = dict(DEFAULT_THRESHOLDS)
+    for item in items or []:
+        metric, _, value = item.partition("=")
+        thresholds[metric] = float(value)
+    return thresholds
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the inference service")
+    parser.add_argument("--url", default="http://localhost:8000", help="Service base URL")
+    parser.add_argument("--endpoint", default="/predict", help="Prediction endpoint path")
+    parser.add_argument("--mode", choices=["closed", "open"], default="closed")
+    parser.add_argument("--concurrency", type=int, default=4,
+                        help="Workers (closed loop) or max outstanding requests (open loop)")
+    parser.add_argument("--rate", type=float, default=10.0, help="Requests per second in open-loop mode")
+    parser.add_argument("--arrival", choices=["uniform", "poisson"], default="poisson",
+                        help="Open-loop inter-arrival distribution")
+    parser.add_argument("--duration", type=float, default=30.0, help="Measured duration in seconds")
+    parser.add_argument("--warmup", type=float, default=5.0, help="Unmeasured warmup in seconds")
+    parser.add_argument("--image-sizes", default="224:1", help="Size mix, e.g. 224:0.6,512:0.3,1024:0.1")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Per-request timeout in seconds")
+    parser.add_argument("--output", help="Write the JSON report to this path")
+    parser.add_argument("--baseline", help="Compare against this JSON report")
+    parser.add_argument("--threshold", action="append", metavar="METRIC=FRACTION",
+                        help="Allowed relative regression, e.g. p99_ms=0.2 (repeatable)")
+    parser.add_argument("--start-server", action="store_true", help="Start a local uvicorn server first")
+    parser.add_argument("--port", type=int, default=8000, help="Port for --start-server")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    server = None
+    if args.start_server:
+        server = start_local_server(args.port)
+        args.url = f"http://127.0.0.1:{args.port}"
+
+    try:
+        if not wait_for_service(args.url):
+            print("✗ Service not ready after 30 attempts")
+            return 1
+
+        report = run_load_test(args)
+        metrics = report["metrics"]
+        print(f"\nRequests: {metrics['requests']}  RPS: {metrics['rps']:.2f}  "
+              f"Errors: {metrics['error_rate'] * 100:.2f}%  Shed: {metrics['shed_rate'] * 100:.2f}%")
+        print(f"Latency ms  p50: {metrics['p50_ms']:.1f}  p90: {metrics['p90_ms']:.1f}  "
+              f"p99: {metrics['p99_ms']:.1f}  p999: {metrics['p999_ms']:.1f}")
+
+        if args.output:
+            write_report(report, args.output)
+            print(f"Report written to {args.output}")
+
+        if args.baseline:
+            print(f"\nComparing against {args.baseline}")
+            rows = compare_reports(report, load_report(args.baseline), parse_thresholds(args.threshold))
+            if not print_comparison(rows):
+                print("\n✗ Performance regression detected")
+                return 1
+            print("\n✓ No regression against baseline")
+        return 0
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,14 +4,30 @@ Download dataset from: https://www.kaggle.com/datasets/bhavikjikadara/dog-and-ca
 Extract to data/raw/ directory with structure:
   data/raw/Cat/ - cat images
   data/raw/Dog/ - dog images
+
+Optionally remove near-duplicate images (perceptual hash), or group them so a
+group never spans train/val/test:
+  python prepare_data.py --dedup drop
+
+Optionally pack the processed images into fixed-size tar shards with an index
+for sequential, listing-free loading (see ShardedImageDataset):
+  python prepare_data.py --shard-dir data/shards --shard-size 1000
 """
 
+import argparse
+import io
+import json
 import os
+import random
 import shutil
+import tarfile
 from pathlib import Path
 from PIL import Image
 from tqdm import tqdm
 
+from src.data_preprocessing import split_for_key, load_groups, SHARD_INDEX, SPLITS, GROUPS_FILE
+from src.dedup import compute_hashes, find_duplicate_groups
+
 def prepare_dataset(raw_dir='data/raw', processed_dir='data/processed'):
     """Prepare and organize dataset."""
     
@@ -54,5 +70,132 @@ def prepare_dataset(raw_dir='data/raw', processed_dir='data/processed'):
     print(f"Cats: {len(list((processed_path / 'cat').glob('*.jpg')))}")
     print(f"Dogs: {len(list((processed_path / 'dog').glob('*.jpg')))}")
 
+def _add_bytes(tar, name, data):
+    info = tarfile.TarInfo(name)
+    info.size = len(data)
+    tar.addfile(info, io.BytesIO(data))
+
+def pack_shards(processed_dir='data/processed', shard_dir='data/shards', shard_size=1000,
+                train_split=0.8, val_split=0.1, seed=42):
+    """Pack processed images into tar shards plus an index.json.
+    
+    Each sample is assigned to a split from its path, or from its duplicate
+    group when a groups.json from deduplicate() is present, and every shard
+    holds a single split. Samples are shuffled across classes before packing
+    so shards mix both classes. The index stores each shard's split and size so
+    datasets know their length without opening any shard.
+    """
+    processed_path = Path(processed_dir)
+    shard_path = Path(shard_dir)
+    shard_path.mkdir(parents=True, exist_ok=True)
+    groups = load_groups(processed_path)
+    
+    classes = sorted(entry.name for entry in os.scandir(processed_path) if entry.is_dir())
+    samples = {split: [] for split in SPLITS}
+    for label, class_name in enumerate(classes):
+        for entry in os.scandir(processed_path / class_name):
+            if entry.is_file():
+                relative = f"{class_name}/{entry.name}"
+                split = split_for_key(groups.get(relative, relative), train_split, val_split)
+                samples[split].append((Path(entry.path), label, f"{class_name}_{Path(entry.name).stem}"))
+    
+    shards = []
+    rng = random.Random(seed)
+    for split in SPLITS:
+        split_samples = sorted(samples[split])
+        rng.shuffle(split_samples)
+        for start in tqdm(range(0, len(split_samples), shard_size), desc=f"Writing {split} shards"):
+            chunk = split_samples[start:start + shard_size]
+            name = f"{split}-{start // shard_size:06d}.tar"
+            with tarfile.open(shard_path / name, "w") as tar:
+                for img_path, label, key in chunk:
+                    _add_bytes(tar, f"{key}.jpg", img_path.read_bytes())
+                    _add_bytes(tar, f"{key}.cls", str(label).encode())
+            shards.append({"name": name, "split": split, "count": len(chunk)})
+    
+    num_samples = sum(len(split_samples) for split_samples in samples.values())
+    index = {
+        "classes": classes,
+        "train_split": train_split,
+        "val_split": val_split,
+        "shard_size": shard_size,
+        "num_samples": num_samples,
+        "shards": shards,
+    }
+    with open(shard_path / SHARD_INDEX, "w") as f:
+        json.dump(index, f, indent=2)
+    
+    print(f"\nPacked {num_samples} images into {len(shards)} shards in {shard_dir}")
+    return index
+
+def deduplicate(processed_dir='data/processed', mode='drop', max_distance=4, workers=None,
+                report_path='data/dedup_report.json'):
+    """Find near-duplicate images by perceptual hash and drop or group them.
+    
+    ``drop`` keeps the first image of each duplicate group and deletes the rest.
+    ``group`` keeps every image and writes groups.json so that each group is
+    assigned to a single train/val/test split. Both write a JSON report.
+    """
+    processed_path = Path(processed_dir)
+    paths = sorted(str(p) for p in processed_path.glob('*/*') if p.is_file())
+    print(f"Hashing {len(paths)} images...")
+    hashes = compute_hashes(paths, workers=workers)
+    groups = find_duplicate_groups(hashes, max_distance=max_distance)
+    
+    def relative(path):
+        return Path(path).relative_to(processed_path).as_posix()
+    
+    duplicates = sum(len(group) - 1 for group in groups)
+    cross_class = sum(1 for group in groups if len({Path(p).parent.name for p in group}) > 1)
+    report = {
+        "mode": mode,
+        "max_distance": max_distance,
+        "images": len(paths),
+        "unreadable": len(paths) - len(hashes),
+        "duplicate_groups": len(groups),
+        "duplicates": duplicates,
+        "cross_class_groups": cross_class,
+        "groups": [[relative(p) for p in group] for group in groups],
+    }
+    
+    if mode == 'drop':
+        for group in groups:
+            for path in group[1:]:
+                os.remove(path)
+        print(f"Removed {duplicates} near-duplicate images from {len(groups)} groups")
+    elif mode == 'group':
+        mapping = {relative(p): relative(group[0]) for group in groups for p in group}
+        with open(processed_path / GROUPS_FILE, "w") as f:
+            json.dump(mapping, f, indent=2)
+        print(f"Grouped {duplicates + len(groups)} images into {len(groups)} duplicate groups")
+    else:
+        raise ValueError(f"Unknown dedup mode '{mode}', expected 'drop' or 'group'")
+    
+    if cross_class:
+        print(f"Warning: {cross_class} duplicate groups span both classes, check their labels")
+    Path(report_path).parent.mkdir(parents=True, exist_ok=True)
+    with open(report_path, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Dedup report written to {report_path}")
+    return report
+
 if __name__ == "__main__":
-    prepare_dataset()
+    parser = argparse.ArgumentParser(description="Prepare the Cats vs Dogs dataset")
+    parser.add_argument("--raw-dir", default="data/raw")
+    parser.add_argument("--processed-dir", default="data/processed")
+    parser.add_argument("--shard-dir", help="Also pack processed images into tar shards here")
+    parser.add_argument("--shard-size", type=int, default=1000, help="Images per shard")
+    parser.add_argument("--skip-resize", action="store_true", help="Reuse existing processed images")
+    parser.add_argument("--dedup", choices=["off", "drop", "group"], default="off",
+                        help="Drop near-duplicates, or group them so each group stays in one split")
+    parser.add_argument("--dedup-distance", type=int, default=4, help="Max Hamming distance between hashes")
+    parser.add_argument("--dedup-workers", type=int, help="Hashing processes (default: all cores)")
+    parser.add_argument("--dedup-report", default="data/dedup_report.json")
+    args = parser.parse_args()
+    
+    if not args.skip_resize:
+        prepare_dataset(args.raw_dir, args.processed_dir)
+    if args.dedup != "off":
+        deduplicate(args.processed_dir, args.dedup, args.dedup_distance, args.dedup_workers, args.dedup_report)
+    if args.shard_dir:
+        pack_shards(args.processed_dir, args.shard_dir, args.shard_size)
@@ -7,6 +7,25 @@ from PIL import Image
 import io
 import time
 
+def make_test_image(size=(224, 224), color='blue'):
+    """Create an in-memory JPEG test image."""
+    img = Image.new('RGB', size, color=color)
+    img_bytes = io.BytesIO()
+    img.save(img_bytes, format='JPEG')
+    img_bytes.seek(0)
+    return img_bytes
+
+def wait_for_service(base_url, max_retries=30):
+    """Wait until the health endpoint answers, return False if it never does."""
+    for i in range(max_retries):
+        try:
+            requests.get(f"{base_url}/health", timeout=5)
+            return True
+        except requests.exceptions.RequestException:
+            if i == max_retries - 1:
+                return False
+            time.sleep(2)
+
 def test_health_check(base_url):
     """Test health endpoint."""
     print("Testing health endpoint...")
@@ -21,10 +40,7 @@ def test_prediction(base_url):
     print("Testing prediction endpoint...")
     
     # Create test image
-    img = Image.new('RGB', (224, 224), color='blue')
-    img_bytes = io.BytesIO()
-    img.save(img_bytes, format='JPEG')
-    img_bytes.seek(0)
+    img_bytes = make_test_image()
     
     # Make prediction request
     files = {'file': ('test.jpg', img_bytes, 'image/jpeg')}
@@ -48,16 +64,9 @@ def main():
     print(f"Running smoke tests against {base_url}")
     
     # Wait for service to be ready
-    max_retries = 30
-    for i in range(max_retries):
-        try:
-            requests.get(f"{base_url}/health", timeout=5)
-            break
-        except requests.exceptions.RequestException:
-            if i == max_retries - 1:
-                print("✗ Service not ready after 30 attempts")
-                sys.exit(1)
-            time.sleep(2)
+    if not wait_for_service(base_url):
+        print("✗ Service not ready after 30 attempts")
+        sys.exit(1)
     
     try:
         test_health_check(base_url)
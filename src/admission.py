@@ -0,0 +1,175 @@
+"""Admission control and load shedding for the inference service.
+
+Requests to guarded paths must obtain one of ``max_in_flight`` slots before
+their body is read. When all slots are busy, up to ``max_queue`` requests wait
+for at most ``queue_timeout`` seconds; everything else is rejected straight
+away with ``503`` and a ``Retry-After`` header. Bodies larger than
+``max_body_bytes`` are rejected with ``413`` as soon as the limit is crossed,
+based on ``Content-Length`` when present and on the streamed byte count
+otherwise.
+"""
+import asyncio
+import json
+import os
+from collections import deque
+from contextlib import asynccontextmanager
+
+from fastapi import HTTPException
+
+from src.metrics import record_shed, set_queue_depth
+
+
+class Overloaded(Exception):
+    """Raised when a request cannot be admitted."""
+
+    def __init__(self, reason):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class AdmissionController:
+    """Bounded concurrency limiter with a bounded, deadline-aware wait queue."""
+
+    def __init__(self, max_in_flight=4, max_queue=32, queue_timeout=5.0):
+        if max_in_flight < 1:
+            raise ValueError("max_in_flight must be at least 1")
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self._waiters = deque()
+
+    @classmethod
+    def from_env(cls):
+        """Build a controller from environment variables."""
+        return cls(
+            max_in_flight=int(os.getenv("MAX_IN_FLIGHT", "4")),
+            max_queue=int(os.getenv("MAX_QUEUE", "32")),
+            queue_timeout=float(os.getenv("QUEUE_TIMEOUT_SECONDS", "5")),
+        )
+
+    @property
+    def queue_depth(self):
+        return len(self._waiters)
+
+    async def acquire(self):
+        """Take a slot, waiting in the queue if allowed."""
+        if self.in_flight < self.max_in_flight and not self._waiters:
+            self.in_flight += 1
+            return
+        if len(self._waiters) >= self.max_queue:
+            raise Overloaded("queue_full")
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        set_queue_depth(len(self._waiters))
+        try:
+            await asyncio.wait_for(waiter, self.queue_timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just as we gave up, pass it on
+                self.release()
+            else:
+                self._discard(waiter)
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            raise Overloaded("queue_timeout")
+        finally:
+            set_queue_depth(len(self._waiters))
+
+    def release(self):
+        """Return a slot, handing it directly to the oldest live waiter."""
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.in_flight -= 1
+
+    def _discard(self, waiter):
+        try:
+            self._waiters.remove(waiter)
+        except ValueError:
+            pass
+
+    @asynccontextmanager
+    async def admit(self):
+        """Hold a slot for the duration of the block."""
+        await self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+
+class AdmissionMiddleware:
+    """ASGI middleware applying admission control and upload size limits."""
+
+    def __init__(self, app, controller, max_body_bytes=10 * 1024 * 1024,
+                 retry_after=1, paths=("/predict",)):
+        self.app = app
+        self.controller = controller
+        self.max_body_bytes = max_body_bytes
+        self.retry_after = retry_after
+        self.paths = tuple(paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith(self.paths):
+            await self.app(scope, receive, send)
+            return
+
+        content_length = _header(scope, b"content-length")
+        if content_length is not None and content_length.isdigit() \
+                and int(content_length) > self.max_body_bytes:
+            record_shed("payload_too_large")
+            await _reject(send, 413, "Upload too large")
+            return
+
+        try:
+            await self.controller.acquire()
+        except Overloaded as e:
+            record_shed(e.reason)
+            await _reject(send, 503, "Service overloaded, retry later",
+                          [(b"retry-after", str(self.retry_after).encode())])
+            return
+
+        try:
+            await self.app(scope, self._limit_body(receive), send)
+        finally:
+            self.controller.release()
+
+    def _limit_body(self, receive):
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_body_bytes:
+                    record_shed("payload_too_large")
+                    raise HTTPException(status_code=413, detail="Upload too large")
+            return message
+
+        return limited_receive
+
+
+def _header(scope, name):
+    for key, value in scope.get("headers", []):
+        if key.lower() == name:
+            return value.decode("latin-1")
+    return None
+
+
+async def _reject(send, status, detail, extra_headers=()):
+    body = json.dumps({"detail": detail}).encode()
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            *extra_headers,
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,138 @@
+"""Shared helpers for benchmark reports and regression checks.
+
+Benchmarks write a JSON report with an ``environment`` block and a flat
+``metrics`` dict. Two reports are compared metric by metric; a metric regresses
+when it moves in the wrong direction by more than its relative threshold.
+"""
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+# Metrics where larger numbers are better, matched by name suffix
+HIGHER_IS_BETTER = ("rps", "throughput", "accuracy")
+
+
+def percentile(sorted_values, q):
+    """Linear-interpolated percentile of an already sorted list, q in [0, 100]."""
+    if not sorted_values:
+        return float("nan")
+    rank = (len(sorted_values) - 1) * q / 100.0
+    low = int(rank)
+    high = min(low + 1, len(sorted_values) - 1)
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (rank - low)
+
+
+def latency_summary(latencies, prefix=""):
+    """Summarize latencies in seconds as millisecond percentiles."""
+    values = sorted(latencies)
+    summary = {
+        f"{prefix}p50_ms": percentile(values, 50) * 1000,
+        f"{prefix}p90_ms": percentile(values, 90) * 1000,
+        f"{prefix}p99_ms": percentile(values, 99) * 1000,
+        f"{prefix}p999_ms": percentile(values, 99.9) * 1000,
+    }
+    if values:
+        summary[f"{prefix}mean_ms"] = sum(values) / len(values) * 1000
+        summary[f"{prefix}max_ms"] = values[-1] * 1000
+    return summary
+
+
+def time_function(fn, repeats=20, warmup=3):
+    """Call ``fn`` repeatedly and return the per-call wall times in seconds."""
+    for _ in range(warmup):
+        fn()
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment_metadata():
+    """Describe the machine and software a benchmark ran on."""
+    metadata = {
+        "timestamp": datetime.utcnow().isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+        "git_commit": _git_commit(),
+    }
+    torch = sys.modules.get("torch")
+    if torch is not None:
+        metadata["torch"] = torch.__version__
+        metadata["torch_threads"] = torch.get_num_threads()
+    return metadata
+
+
+def write_report(report, path):
+    """Write a benchmark report as JSON."""
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+
+
+def load_report(path):
+    """Read a benchmark report written by ``write_report``."""
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def higher_is_better(metric):
+    return metric.endswith(HIGHER_IS_BETTER)
+
+
+def compare_reports(current, baseline, thresholds, default_threshold=None):
+    """Compare report metrics against a baseline.
+
+    ``thresholds`` maps metric names to the largest tolerated relative change
+    in the bad direction (0.1 allows a 10% slowdown). Metrics without a
+    threshold are only checked when ``default_threshold`` is given. Returns
+    one row per compared metric.
+    """
+    rows = []
+    current_metrics = current.get("metrics", current)
+    baseline_metrics = baseline.get("metrics", baseline)
+    for metric in sorted(set(current_metrics) & set(baseline_metrics)):
+        threshold = thresholds.get(metric, default_threshold)
+        if threshold is None:
+            continue
+        old, new = baseline_metrics[metric], current_metrics[metric]
+        if old:
+            change = (new - old) / abs(old)
+        else:
+            change = 0.0 if new == old else float("inf")
+        worse = -change if higher_is_better(metric) else change
+        rows.append({
+            "metric": metric,
+            "baseline": old,
+            "current": new,
+            "change": change,
+            "threshold": threshold,
+            "regression": worse > threshold,
+        })
+    return rows
+
+
+def print_comparison(rows):
+    """Print a comparison table and return True when nothing regressed."""
+    print(f"{'metric':<32} {'baseline':>12} {'current':>12} {'change':>9}  status")
+    for row in rows:
+        status = "REGRESSION" if row["regression"] else "ok"
+        print(f"{row['metric']:<32} {row['baseline']:>12.4f} {row['current']:>12.4f} "
+              f"{row['change'] * 100:>8.1f}%  {status}")
+    return not any(row["regression"] for row in rows)
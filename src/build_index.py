@@ -0,0 +1,124 @@
+"""Build the similarity search index served by /similar.
+
+Embeds every image under ``data_dir`` with a trained model in batched passes
+and writes the embeddings as a memory-mappable .npy matrix (see
+src/similarity.py). ``--pca-dim`` reduces the embedding size and ``--int8``
+stores one byte per dimension; both cut memory and search time at a small
+cost in recall.
+
+Usage:
+  python src/build_index.py --data-dir data/processed --model-dir models --output-dir models/similarity
+  python src/build_index.py --pca-dim 128 --int8
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import torch
+from numpy.lib.format import open_memmap
+from torch.utils.data import DataLoader
+from torchvision import datasets
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.data_preprocessing import get_transforms
+from src.model import load_checkpoint
+from src.similarity import (
+    EMBEDDINGS_FILE, INDEX_META, PATHS_FILE, PCA_FILE, SCALES_FILE, fit_pca, project, quantize_int8
+)
+
+RAW_EMBEDDINGS_FILE = "embeddings_raw.npy"
+
+def build_index(data_dir='data/processed', model_dir='models', output_dir='models/similarity',
+                batch_size=64, pca_dim=None, quantize=False, pca_sample=10000, num_workers=2, chunk_size=8192):
+    """Embed an ImageFolder tree and write a similarity index to ``output_dir``."""
+    start_time = time.time()
+    classes_path = os.path.join(model_dir, "classes.txt")
+    num_classes = 2
+    if os.path.exists(classes_path):
+        with open(classes_path, "r") as f:
+            num_classes = len([line for line in f.read().splitlines() if line.strip()])
+    model, image_size = load_checkpoint(model_dir, num_classes=num_classes)
+
+    dataset = datasets.ImageFolder(data_dir, transform=get_transforms(augment=False, image_size=image_size))
+    loader = DataLoader(dataset, batch_size=batch_size, shuffle=False, num_workers=num_workers)
+    embedding_dim = model.fc1.out_features
+    os.makedirs(output_dir, exist_ok=True)
+
+    # Pass 1: raw embeddings, written straight to disk so memory stays flat
+    raw_path = os.path.join(output_dir, RAW_EMBEDDINGS_FILE)
+    raw = open_memmap(raw_path, mode="w+", dtype=np.float32, shape=(len(dataset), embedding_dim))
+    offset = 0
+    with torch.no_grad():
+        for i, (inputs, _) in enumerate(loader):
+            embeddings = model.embed(inputs).numpy()
+            raw[offset:offset + len(embeddings)] = embeddings
+            offset += len(embeddings)
+            if (i + 1) % 20 == 0:
+                print(f"Embedded {offset}/{len(dataset)} images")
+
+    pca_mean = pca_components = None
+    if pca_dim:
+        rng = np.random.RandomState(0)
+        rows = np.sort(rng.choice(len(dataset), min(len(dataset), pca_sample), replace=False))
+        pca_mean, pca_components = fit_pca(project(raw[rows]), pca_dim)
+        np.savez(os.path.join(output_dir, PCA_FILE), mean=pca_mean, components=pca_components)
+    elif os.path.exists(os.path.join(output_dir, PCA_FILE)):
+        os.remove(os.path.join(output_dir, PCA_FILE))
+
+    # Pass 2: normalize, project and quantize chunk by chunk into the final matrix
+    dim = pca_dim or embedding_dim
+    dtype = np.int8 if quantize else np.float32
+    vectors = open_memmap(os.path.join(output_dir, EMBEDDINGS_FILE), mode="w+", dtype=dtype,
+                          shape=(len(dataset), dim))
+    scales = np.empty(len(dataset), dtype=np.float32) if quantize else None
+    for start in range(0, len(dataset), chunk_size):
+        chunk = project(raw[start:start + chunk_size], pca_mean, pca_components)
+        if quantize:
+            chunk, scales[start:start + len(chunk)] = quantize_int8(chunk)
+        vectors[start:start + len(chunk)] = chunk
+    vectors.flush()
+    del raw, vectors
+    os.remove(raw_path)
+
+    if quantize:
+        np.save(os.path.join(output_dir, SCALES_FILE), scales)
+    elif os.path.exists(os.path.join(output_dir, SCALES_FILE)):
+        os.remove(os.path.join(output_dir, SCALES_FILE))
+
+    with open(os.path.join(output_dir, PATHS_FILE), "w") as f:
+        f.write("\n".join(os.path.relpath(path, data_dir) for path, _ in dataset.samples))
+
+    meta = {
+        "count": len(dataset),
+        "dim": dim,
+        "embedding_dim": embedding_dim,
+        "dtype": np.dtype(dtype).name,
+        "pca_dim": pca_dim,
+        "model_dir": str(model_dir),
+        "data_dir": str(data_dir),
+        "build_seconds": time.time() - start_time,
+    }
+    with open(os.path.join(output_dir, INDEX_META), "w") as f:
+        json.dump(meta, f, indent=2)
+
+    size_mb = os.path.getsize(os.path.join(output_dir, EMBEDDINGS_FILE)) / (1024 * 1024)
+    print(f"\nIndexed {len(dataset)} images ({dim}-d {meta['dtype']}, {size_mb:.1f} MB) in {output_dir}")
+    return meta
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the image similarity index")
+    parser.add_argument("--data-dir", default="data/processed")
+    parser.add_argument("--model-dir", default="models")
+    parser.add_argument("--output-dir", default="models/similarity")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--pca-dim", type=int, help="Reduce embeddings to this many dimensions")
+    parser.add_argument("--int8", action="store_true", help="Store int8 embeddings with per-row scales")
+    parser.add_argument("--num-workers", type=int, default=2)
+    args = parser.parse_args()
+
+    build_index(args.data_dir, args.model_dir, args.output_dir, args.batch_size, args.pca_dim,
+                args.int8, num_workers=args.num_workers)
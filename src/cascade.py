@@ -0,0 +1,70 @@
+"""Two-stage confidence cascade.
+
+A cheap first-stage model (compact and/or low resolution) classifies every
+image. When its top softmax probability reaches the threshold its answer is
+returned; otherwise the image escalates to the full model. Inputs are passed
+as zero-argument callables so the full-size tensor is only built for images
+that actually escalate.
+"""
+import torch
+
+from src.metrics import cascade_stage_timer, record_cascade_outcome, stage_timer
+
+
+class Cascade:
+    """Serve a first-stage model and escalate uncertain images to the full model."""
+
+    def __init__(self, stage1, stage2, threshold=0.9, device="cpu"):
+        self.stage1 = stage1
+        self.stage2 = stage2
+        self.threshold = threshold
+        self.device = device
+
+    def predict(self, stage1_input, stage2_input):
+        """Return (probabilities, stage) for one image.
+
+        ``stage1_input`` and ``stage2_input`` build the batch-of-one tensor for
+        each stage on demand. Building an input is not timed here; each model
+        call is timed as its cascade stage and as the forward stage.
+        """
+        inputs = stage1_input().to(self.device)
+        with cascade_stage_timer("stage1"), stage_timer("forward"), torch.no_grad():
+            probabilities = torch.softmax(self.stage1(inputs), dim=1)[0]
+        if probabilities.max().item() >= self.threshold:
+            record_cascade_outcome("stage1")
+            return probabilities, "stage1"
+
+        inputs = stage2_input().to(self.device)
+        with cascade_stage_timer("stage2"), stage_timer("forward"), torch.no_grad():
+            probabilities = torch.softmax(self.stage2(inputs), dim=1)[0]
+        record_cascade_outcome("escalated")
+        return probabilities, "stage2"
+
+
+def cascade_decisions(stage1_probs, stage2_probs, threshold):
+    """Vectorized cascade over precomputed probabilities.
+
+    Returns the predicted class per sample and a boolean escalation mask.
+    """
+    confidence, stage1_pred = stage1_probs.max(dim=1)
+    escalated = confidence < threshold
+    predictions = torch.where(escalated, stage2_probs.argmax(dim=1), stage1_pred)
+    return predictions, escalated
+
+
+def sweep_thresholds(stage1_probs, stage2_probs, labels, thresholds, stage1_cost, stage2_cost):
+    """Accuracy, escalation rate and average cost per image for each threshold.
+
+    Costs are per-image latencies of each stage; an escalated image pays both.
+    """
+    rows = []
+    for threshold in thresholds:
+        predictions, escalated = cascade_decisions(stage1_probs, stage2_probs, threshold)
+        escalation_rate = escalated.float().mean().item()
+        rows.append({
+            "threshold": threshold,
+            "accuracy": 100.0 * (predictions == labels).float().mean().item(),
+            "escalation_rate": escalation_rate,
+            "avg_cost_ms": stage1_cost + escalation_rate * stage2_cost,
+        })
+    return rows
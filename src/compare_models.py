@@ -0,0 +1,110 @@
+"""Compare model architectures on size, CPU latency and test accuracy.
+
+Each variant is trained through train_model into its own directory (or an
+existing checkpoint is reused) and then measured. Results are logged to the
+"cats-dogs-model-comparison" MLflow experiment, one run per architecture.
+
+Usage:
+  python src/compare_models.py --archs cnn,compact --train --epochs 3
+"""
+import argparse
+import io
+import os
+import sys
+
+import mlflow
+import torch
+import torch.nn as nn
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.benchmarking import time_function, latency_summary
+from src.data_preprocessing import prepare_dataloaders
+from src.model import load_checkpoint, ARCHITECTURES
+from src.train import train_model, validate
+
+def count_parameters(model):
+    """Number of parameters in the model."""
+    return sum(p.numel() for p in model.parameters())
+
+def model_size_bytes(model):
+    """Size of the serialized state dict in bytes."""
+    buffer = io.BytesIO()
+    torch.save(model.state_dict(), buffer)
+    return buffer.tell()
+
+def measure_latency(model, batch_size=1, repeats=20, image_size=224):
+    """CPU forward latency percentiles in milliseconds."""
+    model = model.cpu().eval()
+    inputs = torch.randn(batch_size, 3, image_size, image_size)
+
+    def forward():
+        with torch.no_grad():
+            model(inputs)
+
+    return latency_summary(time_function(forward, repeats=repeats))
+
+def compare_models(archs, data_dir='data/processed', output_dir='models/variants', train=False,
+                   epochs=3, batch_size=32, lr=0.001):
+    """Train or load each architecture, measure it and log results to MLflow."""
+    results = {}
+    test_loader, classes = None, ["cat", "dog"]
+    if os.path.isdir(data_dir):
+        _, _, test_loader, classes = prepare_dataloaders(data_dir, batch_size=batch_size)
+    else:
+        print(f"Data directory {data_dir} not found, skipping accuracy")
+
+    for arch in archs:
+        model_dir = os.path.join(output_dir, arch)
+        checkpoint = os.path.join(model_dir, "model.pth")
+        if train or not os.path.exists(checkpoint):
+            if test_loader is None:
+                print(f"No checkpoint for {arch} and no data to train it, skipping")
+                continue
+            print(f"\nTraining {arch}...")
+            train_model(data_dir=data_dir, epochs=epochs, batch_size=batch_size, lr=lr,
+                        arch=arch, model_dir=model_dir)
+
+        model, _ = load_checkpoint(model_dir, num_classes=len(classes))
+        metrics = {
+            "param_count": count_parameters(model),
+            "model_size_mb": model_size_bytes(model) / (1024 * 1024),
+        }
+        single = measure_latency(model, batch_size=1)
+        batched = measure_latency(model, batch_size=32, repeats=5)
+        metrics["latency_b1_p50_ms"] = single["p50_ms"]
+        metrics["latency_b1_p99_ms"] = single["p99_ms"]
+        metrics["throughput_b32"] = 32 / (batched["p50_ms"] / 1000)
+
+        if test_loader is not None:
+            _, test_acc, _, _ = validate(model, test_loader, nn.CrossEntropyLoss(), torch.device("cpu"))
+            metrics["test_accuracy"] = test_acc
+
+        mlflow.set_experiment("cats-dogs-model-comparison")
+        with mlflow.start_run(run_name=arch):
+            mlflow.log_param("arch", arch)
+            mlflow.log_param("torch_threads", torch.get_num_threads())
+            mlflow.log_metrics(metrics)
+        results[arch] = metrics
+
+    print(f"\n{'arch':<10} {'params':>12} {'size MB':>9} {'p50 ms':>8} {'img/s':>8} {'test acc':>9}")
+    for arch, metrics in results.items():
+        accuracy = metrics.get("test_accuracy")
+        print(f"{arch:<10} {metrics['param_count']:>12,} {metrics['model_size_mb']:>9.2f} "
+              f"{metrics['latency_b1_p50_ms']:>8.2f} {metrics['throughput_b32']:>8.1f} "
+              f"{accuracy if accuracy is not None else float('nan'):>8.2f}%")
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare model architectures")
+    parser.add_argument("--archs", default=",".join(ARCHITECTURES), help="Comma-separated architectures")
+    parser.add_argument("--data-dir", default="data/processed")
+    parser.add_argument("--output-dir", default="models/variants", help="One subdirectory per architecture")
+    parser.add_argument("--train", action="store_true", help="Retrain even if a checkpoint exists")
+    parser.add_argument("--epochs", type=int, default=3)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--lr", type=float, default=0.001)
+    args = parser.parse_args()
+
+    compare_models(args.archs.split(","), data_dir=args.data_dir, output_dir=args.output_dir,
+                   train=args.train, epochs=args.epochs, batch_size=args.batch_size, lr=args.lr)
@@ -1,10 +1,25 @@
+import io
+import json
 import os
+import random
 import shutil
+import tarfile
+import warnings
+import zlib
 from pathlib import Path
 from PIL import Image
 import torch
 from torchvision import transforms, datasets
-from torch.utils.data import DataLoader, random_split
+from torch.utils.data import DataLoader, IterableDataset, Subset, get_worker_info, random_split
+
+IMAGE_SIZE = (224, 224)
+NORMALIZE_MEAN = [0.485, 0.456, 0.406]
+NORMALIZE_STD = [0.229, 0.224, 0.225]
+_MEAN_TENSOR = torch.tensor(NORMALIZE_MEAN).view(3, 1, 1)
+_STD_TENSOR = torch.tensor(NORMALIZE_STD).view(3, 1, 1)
+SHARD_INDEX = "index.json"
+SPLITS = ("train", "val", "test")
+GROUPS_FILE = "groups.json"
 
 def preprocess_image(image_path, target_size=(224, 224)):
     """Preprocess a single image to target size."""
@@ -12,31 +27,169 @@ def preprocess_image(image_path, target_size=(224, 224)):
     img = img.resize(target_size, Image.BILINEAR)
     return img
 
-def get_transforms(augment=True):
+def get_transforms(augment=True, image_size=IMAGE_SIZE):
     """Get data transforms with optional augmentation."""
     if augment:
         return transforms.Compose([
-            transforms.Resize((224, 224)),
+            transforms.Resize(image_size),
             transforms.RandomHorizontalFlip(),
             transforms.RandomRotation(10),
             transforms.ColorJitter(brightness=0.2, contrast=0.2),
             transforms.ToTensor(),
-            transforms.Normalize([0.485, 0.456, 0.406], [0.229, 0.224, 0.225])
+            transforms.Normalize(NORMALIZE_MEAN, NORMALIZE_STD)
         ])
     else:
         return transforms.Compose([
-            transforms.Resize((224, 224)),
+            transforms.Resize(image_size),
             transforms.ToTensor(),
-            transforms.Normalize([0.485, 0.456, 0.406], [0.229, 0.224, 0.225])
+            transforms.Normalize(NORMALIZE_MEAN, NORMALIZE_STD)
         ])
 
-def prepare_dataloaders(data_dir, batch_size=32, train_split=0.8, val_split=0.1):
-    """Prepare train, validation, and test dataloaders."""
-    train_transform = get_transforms(augment=True)
-    test_transform = get_transforms(augment=False)
+def array_to_tensor(array):
+    """Convert a pre-resized HxWx3 uint8 array into a normalized CHW tensor.
+    
+    Equivalent to the non-augmented transform for images that are already
+    the model input size, without the PIL round trip.
+    """
+    if not array.flags.writeable:
+        array = array.copy()
+    tensor = torch.from_numpy(array).permute(2, 0, 1).float().div_(255.0)
+    return tensor.sub_(_MEAN_TENSOR).div_(_STD_TENSOR)
+
+def split_for_key(key, train_split=0.8, val_split=0.1):
+    """Deterministically assign a sample key to the train, val or test split."""
+    position = zlib.crc32(key.encode("utf-8")) / 2 ** 32
+    if position < train_split:
+        return "train"
+    if position < train_split + val_split:
+        return "val"
+    return "test"
+
+def load_groups(data_dir):
+    """Map "class/filename" to its duplicate group key, or {} without a groups.json."""
+    path = Path(data_dir) / GROUPS_FILE
+    if not path.exists():
+        return {}
+    with open(path, "r") as f:
+        return json.load(f)
+
+def load_shard_index(shard_dir):
+    """Read the index written next to a set of tar shards."""
+    with open(Path(shard_dir) / SHARD_INDEX, "r") as f:
+        return json.load(f)
+
+class ShardedImageDataset(IterableDataset):
+    """Stream one split of a sharded dataset written by prepare_data.py --shards.
+    
+    Each shard is a tar file holding ``<key>.jpg`` and ``<key>.cls`` members
+    and is read front to back, so startup only reads the small index and I/O is
+    sequential. Shards are divided between DataLoader workers, and training
+    order is randomized by shuffling the shard order and passing samples
+    through a bounded shuffle buffer.
+    """
+    
+    def __init__(self, shard_dir, split, transform=None, shuffle_buffer=0):
+        self.shard_dir = Path(shard_dir)
+        self.split = split
+        self.transform = transform
+        self.shuffle_buffer = shuffle_buffer
+        index = load_shard_index(shard_dir)
+        self.classes = index["classes"]
+        self.shards = [shard["name"] for shard in index["shards"] if shard["split"] == split]
+        self.length = sum(shard["count"] for shard in index["shards"] if shard["split"] == split)
+    
+    def __len__(self):
+        return self.length
+    
+    def _worker_shards(self, rng):
+        worker = get_worker_info()
+        shards = list(self.shards)
+        if worker is not None:
+            shards = shards[worker.id::worker.num_workers]
+        if self.shuffle_buffer:
+            rng.shuffle(shards)
+        return shards
+    
+    def _read_shard(self, name):
+        pending = {}
+        with tarfile.open(self.shard_dir / name, "r|") as tar:
+            for member in tar:
+                key, _, ext = member.name.rpartition(".")
+                data = tar.extractfile(member).read()
+                if ext == "cls":
+                    label = int(data)
+                    image_bytes = pending.pop(key)
+                    image = Image.open(io.BytesIO(image_bytes)).convert('RGB')
+                    if self.transform is not None:
+                        image = self.transform(image)
+                    yield image, label
+                else:
+                    pending[key] = data
+    
+    def __iter__(self):
+        # DataLoader reseeds torch per epoch and per worker, so this varies too
+        rng = random.Random(torch.randint(0, 2 ** 31, (1,)).item())
+        buffer = []
+        for name in self._worker_shards(rng):
+            for sample in self._read_shard(name):
+                if not self.shuffle_buffer:
+                    yield sample
+                elif len(buffer) < self.shuffle_buffer:
+                    buffer.append(sample)
+                else:
+                    i = rng.randrange(len(buffer))
+                    buffer[i], sample = sample, buffer[i]
+                    yield sample
+        rng.shuffle(buffer)
+        yield from buffer
+
+def _prepare_sharded_dataloaders(data_dir, batch_size, train_split, val_split, image_size, shuffle_buffer,
+                                 num_workers):
+    """Dataloaders over tar shards; splits are fixed when the shards are written."""
+    index = load_shard_index(data_dir)
+    if (index["train_split"], index["val_split"]) != (train_split, val_split):
+        warnings.warn(
+            f"Shards in {data_dir} were split {index['train_split']}/{index['val_split']}, "
+            f"ignoring requested {train_split}/{val_split}"
+        )
+    train_dataset = ShardedImageDataset(data_dir, "train", get_transforms(augment=True, image_size=image_size),
+                                        shuffle_buffer=shuffle_buffer)
+    val_dataset = ShardedImageDataset(data_dir, "val", get_transforms(augment=False, image_size=image_size))
+    test_dataset = ShardedImageDataset(data_dir, "test", get_transforms(augment=False, image_size=image_size))
+    
+    train_loader = DataLoader(train_dataset, batch_size=batch_size, num_workers=num_workers)
+    val_loader = DataLoader(val_dataset, batch_size=batch_size, num_workers=num_workers)
+    test_loader = DataLoader(test_dataset, batch_size=batch_size, num_workers=num_workers)
+    
+    return train_loader, val_loader, test_loader, index["classes"]
+
+def prepare_dataloaders(data_dir, batch_size=32, train_split=0.8, val_split=0.1, image_size=IMAGE_SIZE,
+                        shuffle_buffer=1000, num_workers=2):
+    """Prepare train, validation, and test dataloaders.
+    
+    ``data_dir`` is either an ImageFolder tree or a directory of tar shards
+    with an index.json written by prepare_data.py --shards.
+    """
+    if (Path(data_dir) / SHARD_INDEX).exists():
+        return _prepare_sharded_dataloaders(data_dir, batch_size, train_split, val_split,
+                                            image_size, shuffle_buffer, num_workers)
+    
+    train_transform = get_transforms(augment=True, image_size=image_size)
+    test_transform = get_transforms(augment=False, image_size=image_size)
     
     full_dataset = datasets.ImageFolder(data_dir, transform=train_transform)
     
+    groups = load_groups(data_dir)
+    if groups:
+        # Keep near-duplicate groups from prepare_data.py --dedup group inside one split
+        indices = {split: [] for split in SPLITS}
+        for i, (path, _) in enumerate(full_dataset.samples):
+            relative = Path(path).relative_to(data_dir).as_posix()
+            indices[split_for_key(groups.get(relative, relative), train_split, val_split)].append(i)
+        train_dataset, val_dataset, test_dataset = (Subset(full_dataset, indices[split]) for split in SPLITS)
+        return _image_folder_loaders(full_dataset, train_dataset, val_dataset, test_dataset,
+                                     test_transform, batch_size, num_workers)
+    
     total_size = len(full_dataset)
     train_size = int(train_split * total_size)
     val_size = int(val_split * total_size)
@@ -47,11 +200,16 @@ def prepare_dataloaders(data_dir, batch_size=32, train_split=0.8, val_split=0.1)
         generator=torch.Generator().manual_seed(42)
     )
     
+    return _image_folder_loaders(full_dataset, train_dataset, val_dataset, test_dataset,
+                                 test_transform, batch_size, num_workers)
+
+def _image_folder_loaders(full_dataset, train_dataset, val_dataset, test_dataset, test_transform, batch_size,
+                          num_workers):
     val_dataset.dataset.transform = test_transform
     test_dataset.dataset.transform = test_transform
     
-    train_loader = DataLoader(train_dataset, batch_size=batch_size, shuffle=True, num_workers=2)
-    val_loader = DataLoader(val_dataset, batch_size=batch_size, shuffle=False, num_workers=2)
-    test_loader = DataLoader(test_dataset, batch_size=batch_size, shuffle=False, num_workers=2)
+    train_loader = DataLoader(train_dataset, batch_size=batch_size, shuffle=True, num_workers=num_workers)
+    val_loader = DataLoader(val_dataset, batch_size=batch_size, shuffle=False, num_workers=num_workers)
+    test_loader = DataLoader(test_dataset, batch_size=batch_size, shuffle=False, num_workers=num_workers)
     
     return train_loader, val_loader, test_loader, full_dataset.classes
@@ -0,0 +1,129 @@
+"""Perceptual hashing and near-duplicate detection.
+
+Images are reduced to a 64-bit DCT perceptual hash, which survives resizing and
+re-encoding. Near-duplicates are hashes within a small Hamming distance; they
+are found with a BK-tree, so each lookup only visits the part of the tree that
+can be within range instead of comparing every pair.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+HASH_SIZE = 8
+_IMG_SIZE = HASH_SIZE * 4
+
+
+def _dct_matrix(n):
+    k = np.arange(n)
+    matrix = np.cos(np.pi * (2 * k[None, :] + 1) * k[:, None] / (2 * n))
+    matrix[0] /= np.sqrt(2)
+    return matrix * np.sqrt(2 / n)
+
+
+_DCT = _dct_matrix(_IMG_SIZE)
+
+
+def phash(image):
+    """64-bit perceptual hash of a PIL image as an int."""
+    pixels = np.asarray(image.convert("L").resize((_IMG_SIZE, _IMG_SIZE), Image.LANCZOS), dtype=np.float64)
+    low_freq = (_DCT @ pixels @ _DCT.T)[:HASH_SIZE, :HASH_SIZE].flatten()
+    # Compare against the median of the AC terms; the DC term only encodes brightness
+    bits = low_freq > np.median(low_freq[1:])
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def hash_file(path):
+    """Return (path, hash), or (path, None) if the image cannot be read."""
+    try:
+        with Image.open(path) as image:
+            return path, phash(image)
+    except Exception:
+        return path, None
+
+
+def compute_hashes(paths, workers=None, chunksize=64):
+    """Hash images in parallel worker processes, skipping unreadable files."""
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        results = map(hash_file, paths)
+        return {path: value for path, value in results if value is not None}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = pool.map(hash_file, paths, chunksize=chunksize)
+        return {path: value for path, value in results if value is not None}
+
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+
+class BKTree:
+    """Burkhard-Keller tree over integer hashes with Hamming distance."""
+
+    def __init__(self):
+        self._root = None
+
+    def add(self, value, item):
+        node = [value, [item], {}]
+        if self._root is None:
+            self._root = node
+            return
+        current = self._root
+        while True:
+            distance = hamming(value, current[0])
+            if distance == 0:
+                current[1].append(item)
+                return
+            child = current[2].get(distance)
+            if child is None:
+                current[2][distance] = node
+                return
+            current = child
+
+    def query(self, value, max_distance):
+        """Items whose hash is within ``max_distance`` of ``value``."""
+        if self._root is None:
+            return []
+        matches = []
+        stack = [self._root]
+        while stack:
+            node_value, items, children = stack.pop()
+            distance = hamming(value, node_value)
+            if distance <= max_distance:
+                matches.extend(items)
+            # Triangle inequality: only subtrees at distance d +/- max_distance can match
+            for child_distance, child in children.items():
+                if distance - max_distance <= child_distance <= distance + max_distance:
+                    stack.append(child)
+        return matches
+
+
+def find_duplicate_groups(hashes, max_distance=4):
+    """Group items whose hashes are within ``max_distance`` of each other.
+
+    ``hashes`` maps items (e.g. paths) to hashes. Groups are transitive
+    (connected components) and returned as sorted lists, largest first;
+    singletons are omitted.
+    """
+    items = sorted(hashes)
+    parent = {item: item for item in items}
+
+    def find(item):
+        while parent[item] != item:
+            parent[item] = parent[parent[item]]
+            item = parent[item]
+        return item
+
+    tree = BKTree()
+    for item in items:
+        for match in tree.query(hashes[item], max_distance):
+            root_a, root_b = find(item), find(match)
+            if root_a != root_b:
+                parent[max(root_a, root_b)] = min(root_a, root_b)
+        tree.add(hashes[item], item)
+
+    groups = {}
+    for item in items:
+        groups.setdefault(find(item), []).append(item)
+    return sorted((group for group in groups.values() if len(group) > 1), key=len, reverse=True)
@@ -0,0 +1,211 @@
+"""Evaluate a trained model on a full data split.
+
+Runs batched inference over every sample (decoding in DataLoader workers,
+the forward pass on all intra-op threads), writes one row per sample to a
+Parquet file, logs all metrics to MLflow in a single call and renders the
+confusion matrix and loss curves in a background process so the caller can
+carry on while matplotlib works. train_model uses the same functions.
+
+Usage:
+  python src/evaluate.py --model-dir models --data-dir data/processed --split test
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import mlflow
+import numpy as np
+import torch
+import torch.nn.functional as F
+from sklearn.metrics import confusion_matrix, precision_recall_fscore_support
+from torch.utils.data import Subset
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.data_preprocessing import prepare_dataloaders, SPLITS
+from src.model import load_checkpoint
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # optional, predictions fall back to CSV
+    pa = pq = None
+
+def predict_loader(model, loader, device):
+    """Class probabilities, labels and per-sample losses for a whole loader."""
+    model.eval()
+    all_probs, all_labels, all_losses = [], [], []
+    with torch.inference_mode():
+        for inputs, labels in loader:
+            outputs = model(inputs.to(device, non_blocking=True))
+            labels = labels.to(device, non_blocking=True)
+            all_losses.append(F.cross_entropy(outputs, labels, reduction="none").cpu())
+            all_probs.append(torch.softmax(outputs, dim=1).cpu())
+            all_labels.append(labels.cpu())
+    return torch.cat(all_probs).numpy(), torch.cat(all_labels).numpy(), torch.cat(all_losses).numpy()
+
+def sample_paths(dataset):
+    """File path of every sample in loader order, or None if the dataset has no paths."""
+    if isinstance(dataset, Subset):
+        paths = sample_paths(dataset.dataset)
+        return None if paths is None else [paths[i] for i in dataset.indices]
+    samples = getattr(dataset, "samples", None)
+    return None if samples is None else [path for path, _ in samples]
+
+def compute_metrics(probs, labels, losses, classes, prefix="test"):
+    """Accuracy, loss and per-class precision/recall/F1 as a flat dict."""
+    predictions = probs.argmax(axis=1)
+    precision, recall, f1, _ = precision_recall_fscore_support(
+        labels, predictions, labels=list(range(len(classes))), zero_division=0
+    )
+    metrics = {
+        f"{prefix}_accuracy": 100.0 * float((predictions == labels).mean()),
+        f"{prefix}_loss": float(losses.mean()),
+        f"{prefix}_macro_f1": float(f1.mean()),
+        f"{prefix}_samples": len(labels),
+    }
+    for i, class_name in enumerate(classes):
+        metrics[f"{prefix}_{class_name}_precision"] = float(precision[i])
+        metrics[f"{prefix}_{class_name}_recall"] = float(recall[i])
+        metrics[f"{prefix}_{class_name}_f1"] = float(f1[i])
+    return metrics
+
+def write_predictions(path, probs, labels, losses, classes, paths=None):
+    """Write one row per sample to Parquet, or CSV without pyarrow. Returns the path written."""
+    columns = {
+        "label": labels.astype(np.int64),
+        "prediction": probs.argmax(axis=1).astype(np.int64),
+        "confidence": probs.max(axis=1).astype(np.float32),
+        "loss": losses.astype(np.float32),
+        **{f"prob_{class_name}": probs[:, i].astype(np.float32) for i, class_name in enumerate(classes)},
+    }
+    if paths is not None:
+        columns = {"path": paths, **columns}
+    if pa is None:
+        path = os.path.splitext(path)[0] + ".csv"
+        with open(path, "w") as f:
+            f.write(",".join(columns) + "\n")
+            for row in zip(*columns.values()):
+                f.write(",".join(str(value) for value in row) + "\n")
+        return path
+    pq.write_table(pa.table(columns), path)
+    return path
+
+def plot_confusion_matrix(y_true, y_pred, classes):
+    """Plot confusion matrix."""
+    import matplotlib.pyplot as plt
+
+    cm = confusion_matrix(y_true, y_pred, labels=list(range(len(classes))))
+    fig, ax = plt.subplots(figsize=(8, 6))
+    im = ax.imshow(cm, interpolation='nearest', cmap=plt.cm.Blues)
+    ax.figure.colorbar(im, ax=ax)
+    ax.set(xticks=np.arange(cm.shape[1]), yticks=np.arange(cm.shape[0]),
+           xticklabels=classes, yticklabels=classes,
+           ylabel='True label', xlabel='Predicted label')
+    plt.setp(ax.get_xticklabels(), rotation=45, ha="right", rotation_mode="anchor")
+
+    for i in range(cm.shape[0]):
+        for j in range(cm.shape[1]):
+            ax.text(j, i, format(cm[i, j], 'd'),
+                   ha="center", va="center",
+                   color="white" if cm[i, j] > cm.max() / 2. else "black")
+    fig.tight_layout()
+    return fig
+
+def render_figures(output_dir, labels, predictions, classes, train_losses=None, val_losses=None):
+    """Save the confusion matrix and, if given, loss curves as PNGs. Returns their paths."""
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    paths = []
+    fig = plot_confusion_matrix(labels, predictions, classes)
+    paths.append(os.path.join(output_dir, "confusion_matrix.png"))
+    fig.savefig(paths[-1])
+    plt.close(fig)
+
+    if train_losses:
+        fig, ax = plt.subplots()
+        ax.plot(train_losses, label='Train Loss')
+        ax.plot(val_losses, label='Val Loss')
+        ax.set_xlabel('Epoch')
+        ax.set_ylabel('Loss')
+        ax.legend()
+        paths.append(os.path.join(output_dir, "loss_curves.png"))
+        fig.savefig(paths[-1])
+        plt.close(fig)
+    return paths
+
+def render_figures_async(*args, **kwargs):
+    """Run render_figures in a separate process and return its future."""
+    executor = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn"))
+    future = executor.submit(render_figures, *args, **kwargs)
+    executor.shutdown(wait=False)
+    return future
+
+def evaluate(model, loader, device, classes, output_dir, prefix="test"):
+    """Predict a whole split, write per-sample predictions and return the metrics."""
+    os.makedirs(output_dir, exist_ok=True)
+    probs, labels, losses = predict_loader(model, loader, device)
+    predictions_path = write_predictions(os.path.join(output_dir, f"{prefix}_predictions.parquet"),
+                                         probs, labels, losses, classes, sample_paths(loader.dataset))
+    return {
+        "metrics": compute_metrics(probs, labels, losses, classes, prefix),
+        "labels": labels,
+        "predictions": probs.argmax(axis=1),
+        "predictions_path": predictions_path,
+    }
+
+def evaluate_checkpoint(model_dir='models', data_dir='data/processed', split='test', batch_size=128,
+                        num_workers=None, output_dir=None, log_mlflow=True):
+    """Evaluate a saved model on one split and log the results to MLflow."""
+    num_workers = min(8, os.cpu_count() or 1) if num_workers is None else num_workers
+    output_dir = output_dir or os.path.join(model_dir, "evaluation")
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+
+    with open(os.path.join(model_dir, "classes.txt"), "r") as f:
+        classes = [line.strip() for line in f if line.strip()]
+    model, image_size = load_checkpoint(model_dir, num_classes=len(classes), map_location=device)
+    loaders = prepare_dataloaders(data_dir, batch_size=batch_size, image_size=image_size, num_workers=num_workers)
+    if loaders[3] != classes:
+        raise ValueError(f"Model classes {classes} do not match dataset classes {loaders[3]}")
+    loader = loaders[SPLITS.index(split)]
+
+    print(f"Evaluating {model_dir} on {len(loader.dataset)} {split} samples "
+          f"({torch.get_num_threads()} threads, {num_workers} loader workers)...")
+    evaluation = evaluate(model.to(device), loader, device, classes, output_dir, prefix=split)
+    figures = render_figures_async(output_dir, evaluation["labels"], evaluation["predictions"], classes)
+
+    metrics = evaluation["metrics"]
+    for name, value in metrics.items():
+        print(f"  {name}: {value:.4f}")
+    print(f"Predictions written to {evaluation['predictions_path']}")
+
+    if log_mlflow:
+        mlflow.set_experiment("cats-dogs-evaluation")
+        with mlflow.start_run():
+            mlflow.log_params({"model_dir": model_dir, "data_dir": data_dir, "split": split})
+            mlflow.log_metrics(metrics)
+            figures.result()
+            mlflow.log_artifacts(output_dir)
+    else:
+        figures.result()
+    return evaluation
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Evaluate a trained model on a full data split")
+    parser.add_argument("--model-dir", default="models")
+    parser.add_argument("--data-dir", default="data/processed")
+    parser.add_argument("--split", choices=SPLITS, default="test")
+    parser.add_argument("--batch-size", type=int, default=128)
+    parser.add_argument("--num-workers", type=int, help="DataLoader workers (default: up to 8)")
+    parser.add_argument("--threads", type=int, help="Torch intra-op threads (default: all cores)")
+    parser.add_argument("--output-dir", help="Where to write predictions and figures")
+    parser.add_argument("--no-mlflow", action="store_true", help="Do not log to MLflow")
+    args = parser.parse_args()
+
+    torch.set_num_threads(args.threads or os.cpu_count() or 1)
+    evaluate_checkpoint(args.model_dir, args.data_dir, args.split, args.batch_size, args.num_workers,
+                        args.output_dir, log_mlflow=not args.no_mlflow)
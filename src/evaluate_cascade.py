@@ -0,0 +1,102 @@
+"""Offline threshold sweep for the two-stage cascade.
+
+Runs both stages over the test split once, then replays the cascade decision
+for each threshold to show accuracy against average cost per image. Stage
+costs are measured single-image CPU latencies, matching how the service runs.
+
+Usage:
+  python src/evaluate_cascade.py --stage1 models/stage1 --stage2 models
+"""
+import argparse
+import json
+import os
+import sys
+
+import mlflow
+import torch
+import torch.nn.functional as F
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.benchmarking import time_function, latency_summary
+from src.cascade import sweep_thresholds
+from src.data_preprocessing import prepare_dataloaders
+from src.model import load_checkpoint
+
+DEFAULT_THRESHOLDS = [0.5, 0.6, 0.7, 0.8, 0.85, 0.9, 0.95, 0.97, 0.99, 1.01]
+
+def collect_probabilities(model, loader, image_size=None):
+    """Softmax outputs and labels for the whole loader, resizing inputs if asked."""
+    all_probs, all_labels = [], []
+    with torch.no_grad():
+        for inputs, labels in loader:
+            if image_size is not None and tuple(inputs.shape[-2:]) != tuple(image_size):
+                inputs = F.interpolate(inputs, size=image_size, mode="bilinear",
+                                       align_corners=False, antialias=True)
+            all_probs.append(torch.softmax(model(inputs), dim=1))
+            all_labels.append(labels)
+    return torch.cat(all_probs), torch.cat(all_labels)
+
+def measure_cost_ms(model, image_size, repeats=30):
+    """Median single-image CPU latency in milliseconds."""
+    inputs = torch.randn(1, 3, *image_size)
+
+    def forward():
+        with torch.no_grad():
+            model(inputs)
+
+    return latency_summary(time_function(forward, repeats=repeats))["p50_ms"]
+
+def evaluate_cascade(stage1_dir, stage2_dir, data_dir='data/processed', thresholds=DEFAULT_THRESHOLDS,
+                     batch_size=32, log_mlflow=True):
+    """Sweep cascade thresholds on the test split and return one row per threshold."""
+    _, _, test_loader, classes = prepare_dataloaders(data_dir, batch_size=batch_size)
+    stage1, stage1_size = load_checkpoint(stage1_dir, num_classes=len(classes))
+    stage2, stage2_size = load_checkpoint(stage2_dir, num_classes=len(classes))
+
+    print(f"Running stage1 ({stage1_dir}, {stage1_size}) and stage2 ({stage2_dir}, {stage2_size}) on the test split...")
+    stage1_probs, labels = collect_probabilities(stage1, test_loader, stage1_size)
+    stage2_probs, _ = collect_probabilities(stage2, test_loader, stage2_size)
+    stage1_cost = measure_cost_ms(stage1, stage1_size)
+    stage2_cost = measure_cost_ms(stage2, stage2_size)
+
+    rows = sweep_thresholds(stage1_probs, stage2_probs, labels, thresholds, stage1_cost, stage2_cost)
+
+    print(f"\nStage costs: stage1 {stage1_cost:.2f} ms, stage2 {stage2_cost:.2f} ms per image")
+    print(f"{'threshold':>10} {'accuracy':>9} {'escalated':>10} {'avg ms':>8}")
+    for row in rows:
+        print(f"{row['threshold']:>10.2f} {row['accuracy']:>8.2f}% {row['escalation_rate'] * 100:>9.1f}% "
+              f"{row['avg_cost_ms']:>8.2f}")
+
+    if log_mlflow:
+        mlflow.set_experiment("cats-dogs-cascade")
+        with mlflow.start_run():
+            mlflow.log_param("stage1_dir", stage1_dir)
+            mlflow.log_param("stage2_dir", stage2_dir)
+            mlflow.log_metrics({"stage1_cost_ms": stage1_cost, "stage2_cost_ms": stage2_cost})
+            for step, row in enumerate(rows):
+                mlflow.log_metrics({
+                    "threshold": row["threshold"],
+                    "cascade_accuracy": row["accuracy"],
+                    "escalation_rate": row["escalation_rate"],
+                    "avg_cost_ms": row["avg_cost_ms"],
+                }, step=step)
+    return rows
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sweep cascade confidence thresholds")
+    parser.add_argument("--stage1", default="models/stage1", help="First-stage model directory")
+    parser.add_argument("--stage2", default="models", help="Full model directory")
+    parser.add_argument("--data-dir", default="data/processed")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--thresholds", help="Comma-separated thresholds to sweep")
+    parser.add_argument("--output", help="Write the sweep as JSON")
+    parser.add_argument("--no-mlflow", action="store_true", help="Do not log to MLflow")
+    args = parser.parse_args()
+
+    thresholds = [float(t) for t in args.thresholds.split(",")] if args.thresholds else DEFAULT_THRESHOLDS
+    rows = evaluate_cascade(args.stage1, args.stage2, args.data_dir, thresholds,
+                            batch_size=args.batch_size, log_mlflow=not args.no_mlflow)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(rows, f, indent=2)
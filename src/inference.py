@@ -1,4 +1,6 @@
+import hmac
 import io
+import json
 import time
 import logging
 import os
@@ -7,17 +9,38 @@ from datetime import datetime
 from pathlib import Path
 from typing import Dict
 
+import numpy as np
 import torch
+import torch.nn.functional as F
 import uvicorn
-from fastapi import FastAPI, File, UploadFile, HTTPException
+from fastapi import FastAPI, File, UploadFile, HTTPException, Request, Query
+from fastapi.concurrency import run_in_threadpool
 from PIL import Image
-from prometheus_client import Counter, Histogram, generate_latest
+from prometheus_client import generate_latest
 from fastapi.responses import Response
+from starlette.datastructures import UploadFile as StarletteUploadFile
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from src.model import get_model
-from src.data_preprocessing import get_transforms
+from src.model import build_model_from_config, load_model_config, load_checkpoint
+from src.cascade import Cascade
+from src.drift import DriftMonitor, MODEL_FEATURES, REFERENCE_PROFILE, channel_stats, load_reference_profile
+from src.similarity import EmbeddingIndex, INDEX_META, load_index_meta, normalize
+from src.data_preprocessing import get_transforms, array_to_tensor, IMAGE_SIZE
+from src.admission import AdmissionController, AdmissionMiddleware
+from src.profiling import Profiler, ProfilerBusy, ProfilingMiddleware, PROFILE_FORMATS
+from src.prediction_logging import (
+    start_prediction_logging, stop_prediction_logging, log_prediction, log_prediction_error
+)
+from src.metrics import (
+    stage_timer, track_in_flight, record_request, record_prediction, record_error, observe_image,
+    record_index_load, similarity_query_timer, set_drift_scores
+)
+
+try:
+    import msgpack
+except ImportError:  # optional, only needed for msgpack responses
+    msgpack = None
 
 # Setup logging
 logging.basicConfig(
@@ -26,31 +49,49 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Prometheus metrics
-REQUEST_COUNT = Counter('prediction_requests_total', 'Total prediction requests')
-REQUEST_LATENCY = Histogram('prediction_latency_seconds', 'Prediction latency')
-PREDICTION_COUNT = Counter('predictions_by_class', 'Predictions by class', ['class_name'])
-
 app = FastAPI(title="Cats vs Dogs Classifier", version="1.0.0")
 
+SERVING_PATHS = ("/predict", "/embed", "/similar")
+
+# On-demand profiling, only installed when an admin token is configured
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+profiler = Profiler()
+if ADMIN_TOKEN:
+    app.add_middleware(ProfilingMiddleware, profiler=profiler, paths=SERVING_PATHS)
+
+# Admission control: bounded concurrency, bounded queue and upload size limit
+admission = AdmissionController.from_env()
+app.add_middleware(
+    AdmissionMiddleware,
+    controller=admission,
+    max_body_bytes=int(os.getenv("MAX_UPLOAD_BYTES", str(10 * 1024 * 1024))),
+    retry_after=int(os.getenv("RETRY_AFTER_SECONDS", "1")),
+    paths=SERVING_PATHS,
+)
+
 # Global model and classes
 model = None
 classes = []
 device = None
 transform = None
+image_size = IMAGE_SIZE
+cascade = None
+cascade_transform = None
+cascade_image_size = None
+similarity_index = None
+drift_monitor = None
 
 def load_model():
     """Load the trained model."""
-    global model, classes, device, transform
+    global model, classes, device, transform, image_size, cascade, cascade_transform, cascade_image_size
     
     device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
     logger.info(f"Using device: {device}")
     
-    # Load transform first
-    transform = get_transforms(augment=False)
+    model_dir = Path(os.getenv("MODEL_DIR", "models"))
     
     # Load classes
-    classes_path = Path("models/classes.txt")
+    classes_path = model_dir / "classes.txt"
     if classes_path.exists():
         with open(classes_path, "r") as f:
             classes = [line.strip() for line in f.readlines()]
@@ -58,8 +99,11 @@ def load_model():
         classes = ["cat", "dog"]
     
     # Load model
-    model = get_model(num_classes=len(classes))
-    model_path = Path("models/model.pth")
+    model_config = load_model_config(model_dir / "model_config.json")
+    model, image_size = build_model_from_config(model_config, num_classes=len(classes))
+    transform = get_transforms(augment=False, image_size=image_size)
+    logger.info(f"Model architecture: {model_config['arch']} at {image_size}")
+    model_path = model_dir / "model.pth"
     
     if not model_path.exists():
         logger.warning("Model file not found, using untrained model")
@@ -69,14 +113,78 @@ def load_model():
     
     model.to(device)
     model.eval()
+    
+    # Optional two-stage cascade: a cheap first stage answers confident images
+    cascade = None
+    if os.getenv("CASCADE_ENABLED", "0").lower() in ("1", "true", "yes"):
+        stage1_dir = Path(os.getenv("CASCADE_MODEL_DIR", "models/stage1"))
+        if not (stage1_dir / "model.pth").exists():
+            logger.warning(f"Cascade enabled but no first-stage model in {stage1_dir}, cascade disabled")
+        else:
+            stage1, cascade_image_size = load_checkpoint(stage1_dir, num_classes=len(classes), map_location=device)
+            cascade_transform = get_transforms(augment=False, image_size=cascade_image_size)
+            cascade = Cascade(stage1.to(device), model, threshold=float(os.getenv("CASCADE_THRESHOLD", "0.9")),
+                              device=device)
+            logger.info(f"Cascade enabled: stage1 from {stage1_dir} at {cascade_image_size}, "
+                        f"threshold {cascade.threshold}")
+    
+    load_drift_monitor(model_dir)
+    load_similarity_index()
+
+def load_drift_monitor(model_dir):
+    """Start drift monitoring against the profile exported by train_model, if there is one."""
+    global drift_monitor
+    
+    drift_monitor = None
+    profile_path = Path(model_dir) / REFERENCE_PROFILE
+    if os.getenv("DRIFT_ENABLED", "1").lower() in ("0", "false", "no"):
+        logger.info("Drift monitoring disabled")
+        return
+    if not profile_path.exists():
+        logger.info(f"No reference profile at {profile_path}, drift monitoring disabled")
+        return
+    # The reference comes from the full model at full resolution, the cascade's first stage
+    # answers only confident images and sees a smaller input
+    exclude = MODEL_FEATURES if cascade is not None else ()
+    drift_monitor = DriftMonitor(load_reference_profile(profile_path),
+                                 window=int(os.getenv("DRIFT_WINDOW", "5000")), exclude=exclude,
+                                 channel_sample_rate=int(os.getenv("DRIFT_CHANNEL_SAMPLE_RATE", "20")))
+    logger.info(f"Drift monitoring enabled for {len(drift_monitor.reference)} features")
+
+def load_similarity_index():
+    """Open the similarity index built by src/build_index.py, if there is one."""
+    global similarity_index
+    
+    similarity_index = None
+    index_dir = Path(os.getenv("SIMILARITY_INDEX_DIR", "models/similarity"))
+    if not (index_dir / INDEX_META).exists():
+        logger.info(f"No similarity index in {index_dir}, /similar disabled")
+        return
+    meta = load_index_meta(index_dir)
+    if meta["embedding_dim"] != model.fc1.out_features:
+        logger.warning(f"Similarity index in {index_dir} was built with {meta['embedding_dim']}-d embeddings, "
+                       f"model has {model.fc1.out_features}, /similar disabled")
+        return
+    start_time = time.perf_counter()
+    similarity_index = EmbeddingIndex.load(index_dir)
+    load_seconds = time.perf_counter() - start_time
+    record_index_load(load_seconds, len(similarity_index))
+    logger.info(f"Similarity index loaded: {len(similarity_index)} images, {similarity_index.dim}-d "
+                f"{meta['dtype']} in {load_seconds * 1000:.1f} ms")
 
 @app.on_event("startup")
 async def startup_event():
     """Initialize model on startup."""
     global transform
     load_model()
+    start_prediction_logging()
     logger.info("Application startup complete")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Flush pending prediction logs on shutdown."""
+    stop_prediction_logging()
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint."""
@@ -87,60 +195,327 @@ async def health_check():
         "timestamp": datetime.utcnow().isoformat()
     }
 
-@app.post("/predict")
-async def predict(file: UploadFile = File(...)) -> Dict:
-    """Prediction endpoint."""
-    start_time = time.time()
-    REQUEST_COUNT.inc()
-    
+def _decode_image(contents, endpoint):
+    """Decode uploaded bytes into an RGB image."""
     try:
-        # Validate file type
-        if not file.content_type.startswith("image/"):
-            raise HTTPException(status_code=400, detail="File must be an image")
-        
-        # Read and preprocess image
-        contents = await file.read()
-        image = Image.open(io.BytesIO(contents)).convert('RGB')
-        
-        # Transform and predict
-        input_tensor = transform(image).unsqueeze(0).to(device)
-        
-        with torch.no_grad():
-            outputs = model(input_tensor)
+        with stage_timer("decode"):
+            image = Image.open(io.BytesIO(contents)).convert('RGB')
+    except Exception as e:
+        record_error("decode_error")
+        log_prediction_error("decode_error", str(e), endpoint=endpoint)
+        raise HTTPException(status_code=400, detail=f"Invalid image: {str(e)}")
+    return image
+
+def _observe_upload(contents, image):
+    """Record the size and resolution of an image sent for classification."""
+    observe_image(len(contents), *image.size)
+    if drift_monitor is not None:
+        drift_monitor.observe_input(len(contents), *image.size)
+
+def _observe_tensor(input_tensor):
+    """Feed per-channel statistics of a normalized full-size batch of one to the drift monitor, when sampled."""
+    if drift_monitor is not None and drift_monitor.sample_channels():
+        means, stds = channel_stats(input_tensor)
+        drift_monitor.observe_channels(means[0], stds[0])
+    return input_tensor
+
+def _forward(input_tensor, endpoint):
+    """Run the model on a batch of one and return class probabilities."""
+    try:
+        with stage_timer("forward"), torch.no_grad():
+            outputs = model(input_tensor.to(device))
             probabilities = torch.softmax(outputs, dim=1)
-            confidence, predicted = torch.max(probabilities, 1)
-        
-        predicted_class = classes[predicted.item()]
-        confidence_score = confidence.item()
-        
-        # Update metrics
-        PREDICTION_COUNT.labels(class_name=predicted_class).inc()
+        return probabilities[0]
+    except Exception as e:
+        record_error("inference_error")
+        log_prediction_error("inference_error", str(e), endpoint=endpoint)
+        raise HTTPException(status_code=500, detail=f"Prediction failed: {str(e)}")
+
+def _forward_cascade(stage1_input, stage2_input, endpoint):
+    """Run the cascade, building each stage's input only when it is needed.
+    
+    The cascade times each model call as the forward stage, so an escalated
+    image records two forward samples.
+    """
+    try:
+        probabilities, _ = cascade.predict(stage1_input, stage2_input)
+        return probabilities
+    except Exception as e:
+        record_error("inference_error")
+        log_prediction_error("inference_error", str(e), endpoint=endpoint)
+        raise HTTPException(status_code=500, detail=f"Prediction failed: {str(e)}")
+
+def _transform_image(image_transform, image):
+    """Transform an image into a batch of one, timed as the transform stage."""
+    with stage_timer("transform"):
+        return image_transform(image).unsqueeze(0)
+
+def _predict_image_bytes(contents, endpoint):
+    """Decode, transform and classify an encoded image.
+    
+    Runs in a worker thread so CPU work never blocks the event loop.
+    """
+    image = _decode_image(contents, endpoint)
+    _observe_upload(contents, image)
+    if cascade is not None:
+        return _forward_cascade(
+            lambda: _transform_image(cascade_transform, image),
+            lambda: _transform_image(transform, image),
+            endpoint
+        )
+    return _forward(_observe_tensor(_transform_image(transform, image)), endpoint)
+
+def _build_result(probabilities, start_time):
+    """Turn class probabilities into the prediction response."""
+    with stage_timer("postprocess"):
+        probs = probabilities.tolist()
+        predicted = max(range(len(probs)), key=probs.__getitem__)
+        predicted_class = classes[predicted]
         latency = time.time() - start_time
-        REQUEST_LATENCY.observe(latency)
-        
-        # Log prediction
-        logger.info(f"Prediction: {predicted_class}, Confidence: {confidence_score:.4f}, "
-                   f"Latency: {latency:.4f}s, File: {file.filename}")
-        
         result = {
             "prediction": predicted_class,
-            "confidence": float(confidence_score),
+            "confidence": float(probs[predicted]),
             "probabilities": {
-                classes[i]: float(probabilities[0][i])
+                classes[i]: float(probs[i])
                 for i in range(len(classes))
             },
             "latency_seconds": latency
         }
+    record_prediction(predicted_class, latency)
+    if drift_monitor is not None:
+        drift_monitor.observe_prediction(predicted, result["confidence"])
+    return result
+
+@app.post("/predict")
+async def predict(request: Request) -> Dict:
+    """Prediction endpoint taking a multipart upload in the ``file`` field.
+    
+    The form is parsed here rather than by FastAPI so the read stage covers
+    receiving the body and multipart parsing, not just the spooled upload.
+    """
+    start_time = time.time()
+    record_request()
+    
+    with track_in_flight():
+        with stage_timer("read"):
+            form = await request.form()
+            try:
+                file = form.get("file")
+                contents = await file.read() if isinstance(file, StarletteUploadFile) else None
+            finally:
+                await form.close()
         
+        if contents is None:
+            detail = "Request must be multipart/form-data with a 'file' field"
+            record_error("invalid_content_type")
+            log_prediction_error("invalid_content_type", detail, endpoint="/predict")
+            raise HTTPException(status_code=422, detail=detail)
+        # Validate file type
+        if not (file.content_type or "").startswith("image/"):
+            record_error("invalid_content_type")
+            log_prediction_error("invalid_content_type", "File must be an image", endpoint="/predict")
+            raise HTTPException(status_code=400, detail="File must be an image")
+        
+        probabilities = await profiler.run(_predict_image_bytes, contents, "/predict")
+        result = _build_result(probabilities, start_time)
+        log_prediction(result, endpoint="/predict", filename=file.filename)
         return result
+
+MSGPACK_TYPES = ("application/msgpack", "application/x-msgpack")
+BINARY_TYPE = "application/octet-stream"
+NPY_TYPES = ("application/x-npy", "application/npy")
+
+def _encode_result(result, accept):
+    """Encode a prediction in the format requested by the Accept header.
+    
+    ``application/msgpack`` returns the JSON document packed with msgpack.
+    ``application/octet-stream`` returns the probabilities as little-endian
+    float32 values in class order, with the prediction in response headers.
+    """
+    accept = (accept or "").lower()
+    if any(media_type in accept for media_type in MSGPACK_TYPES):
+        if msgpack is None:
+            raise HTTPException(status_code=406, detail="msgpack responses require the msgpack package")
+        return Response(content=msgpack.packb(result), media_type=MSGPACK_TYPES[0])
+    if BINARY_TYPE in accept:
+        probs = np.asarray([result["probabilities"][c] for c in classes], dtype="<f4")
+        return Response(content=probs.tobytes(), media_type=BINARY_TYPE, headers={
+            "X-Prediction": result["prediction"],
+            "X-Confidence": f"{result['confidence']:.6f}",
+            "X-Classes": ",".join(classes),
+        })
+    return result
+
+def _parse_array(body, content_type, shape_header):
+    """Parse an HxWx3 uint8 image at the model's input size from a .npy file or raw buffer."""
+    try:
+        if content_type in NPY_TYPES:
+            array = np.load(io.BytesIO(body), allow_pickle=False)
+            if not isinstance(array, np.ndarray):
+                raise ValueError("Body must hold a single .npy array, not an .npz archive")
+        else:
+            if not shape_header:
+                raise ValueError("X-Array-Shape header is required for raw buffers")
+            shape = tuple(int(dim) for dim in shape_header.split(","))
+            array = np.frombuffer(body, dtype="<u1").reshape(shape)
+    except (ValueError, EOFError, OSError) as e:
+        record_error("decode_error")
+        log_prediction_error("decode_error", str(e), endpoint="/predict/array")
+        raise HTTPException(status_code=400, detail=f"Invalid array: {str(e)}")
+    
+    expected = (image_size[0], image_size[1], 3)
+    if array.dtype != np.uint8 or array.shape != expected:
+        detail = f"Array must be uint8 with shape {expected}, got {array.dtype} {array.shape}"
+        record_error("decode_error")
+        log_prediction_error("decode_error", detail, endpoint="/predict/array")
+        raise HTTPException(status_code=400, detail=detail)
+    return array
+
+def _resize_for_cascade(input_tensor):
+    """Downsample a full-size batch to the first-stage resolution."""
+    with stage_timer("transform"):
+        return F.interpolate(input_tensor, size=cascade_image_size, mode="bilinear",
+                             align_corners=False, antialias=True)
+
+def _predict_array(array):
+    """Normalize and classify a pre-resized uint8 image."""
+    with stage_timer("transform"):
+        input_tensor = _observe_tensor(array_to_tensor(array).unsqueeze(0))
+    if cascade is not None:
+        return _forward_cascade(lambda: _resize_for_cascade(input_tensor), lambda: input_tensor, "/predict/array")
+    return _forward(input_tensor, "/predict/array")
+
+@app.post("/predict/raw")
+async def predict_raw(request: Request):
+    """Prediction endpoint taking the encoded image as the request body."""
+    start_time = time.time()
+    record_request()
+    
+    with track_in_flight():
+        content_type = request.headers.get("content-type", "")
+        if not (content_type.startswith("image/") or content_type.startswith(BINARY_TYPE)):
+            detail = "Body must be an image or application/octet-stream"
+            record_error("invalid_content_type")
+            log_prediction_error("invalid_content_type", detail, endpoint="/predict/raw")
+            raise HTTPException(status_code=415, detail=detail)
         
+        with stage_timer("read"):
+            contents = await request.body()
+        probabilities = await profiler.run(_predict_image_bytes, contents, "/predict/raw")
+        result = _build_result(probabilities, start_time)
+        log_prediction(result, endpoint="/predict/raw")
+        return _encode_result(result, request.headers.get("accept"))
+
+@app.post("/predict/array")
+async def predict_array(request: Request):
+    """Prediction endpoint taking an HxWx3 uint8 array at the model's input size.
+    
+    Send either a ``.npy`` file (``application/x-npy``) or the raw pixel
+    buffer (``application/octet-stream``) with an ``X-Array-Shape: H,W,3``
+    header, 224,224,3 for the default model. Decoding and resizing are skipped
+    entirely.
+    """
+    start_time = time.time()
+    record_request()
+    
+    with track_in_flight():
+        content_type = request.headers.get("content-type", "").split(";")[0].strip()
+        if content_type not in NPY_TYPES and content_type != BINARY_TYPE:
+            detail = "Body must be application/x-npy or application/octet-stream"
+            record_error("invalid_content_type")
+            log_prediction_error("invalid_content_type", detail, endpoint="/predict/array")
+            raise HTTPException(status_code=415, detail=detail)
+        
+        with stage_timer("read"):
+            body = await request.body()
+        array = _parse_array(body, content_type, request.headers.get("x-array-shape"))
+        probabilities = await profiler.run(_predict_array, array)
+        result = _build_result(probabilities, start_time)
+        log_prediction(result, endpoint="/predict/array")
+        return _encode_result(result, request.headers.get("accept"))
+
+def _embed_image_bytes(contents, endpoint):
+    """Decode an image and return its raw embedding from the full model."""
+    image = _decode_image(contents, endpoint)
+    input_tensor = _transform_image(transform, image)
+    try:
+        with stage_timer("forward"), torch.no_grad():
+            embedding = model.embed(input_tensor.to(device))[0]
+        return embedding.cpu().numpy()
     except Exception as e:
-        logger.error(f"Prediction error: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Prediction failed: {str(e)}")
+        record_error("inference_error")
+        log_prediction_error("inference_error", str(e), endpoint=endpoint)
+        raise HTTPException(status_code=500, detail=f"Embedding failed: {str(e)}")
+
+def _search_image_bytes(contents, k):
+    """Embed an image and find its nearest neighbours in the index."""
+    embedding = _embed_image_bytes(contents, "/similar")
+    with similarity_query_timer():
+        return similarity_index.search(embedding, k)[0]
+
+def _check_image_upload(file, endpoint):
+    if not (file.content_type or "").startswith("image/"):
+        record_error("invalid_content_type")
+        log_prediction_error("invalid_content_type", "File must be an image", endpoint=endpoint)
+        raise HTTPException(status_code=400, detail="File must be an image")
+
+@app.post("/embed")
+async def embed(file: UploadFile = File(...)) -> Dict:
+    """Return the L2-normalized fc1 embedding of an image."""
+    _check_image_upload(file, "/embed")
+    contents = await file.read()
+    embedding = normalize(await profiler.run(_embed_image_bytes, contents, "/embed"))
+    return {"embedding": embedding.tolist(), "dim": len(embedding)}
+
+@app.post("/similar")
+async def similar(file: UploadFile = File(...), k: int = Query(5, ge=1, le=100)) -> Dict:
+    """Return the ``k`` indexed images most similar to an image, by cosine similarity."""
+    if similarity_index is None:
+        raise HTTPException(status_code=503, detail="Similarity index not loaded")
+    start_time = time.time()
+    _check_image_upload(file, "/similar")
+    contents = await file.read()
+    matches = await profiler.run(_search_image_bytes, contents, k)
+    return {
+        "results": [{"path": path, "score": score} for path, score in matches],
+        "latency_seconds": time.time() - start_time
+    }
+
+@app.post("/admin/profile")
+async def profile_server(request: Request, requests: int = Query(None, ge=1), seconds: float = Query(30.0, gt=0, le=300),
+                         output: str = Query("json"), sample_interval: float = Query(0.005, ge=0.001, le=1.0)):
+    """Profile the server over the next ``requests`` requests or ``seconds`` seconds.
+    
+    Requires the ``X-Admin-Token`` header to match ``ADMIN_TOKEN``. ``output``
+    selects a Chrome trace (``chrome``), folded stacks (``folded``) or both
+    with a summary (``json``).
+    """
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not hmac.compare_digest(request.headers.get("x-admin-token", ""), ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+    if output not in PROFILE_FORMATS:
+        raise HTTPException(status_code=400, detail=f"output must be one of {', '.join(PROFILE_FORMATS)}")
+    
+    try:
+        session = await profiler.capture(requests, seconds, sample_interval)
+    except ProfilerBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    logger.info(f"Profile captured: {session.summary()}")
+    
+    if output == "folded":
+        return Response(content=session.folded_stacks(), media_type="text/plain")
+    trace = await run_in_threadpool(session.chrome_trace)
+    if output == "chrome":
+        return Response(content=json.dumps(trace), media_type="application/json",
+                        headers={"Content-Disposition": "attachment; filename=profile.trace.json"})
+    return {**session.summary(), "folded_stacks": session.folded_stacks(), "chrome_trace": trace}
 
 @app.get("/metrics")
 async def metrics():
     """Prometheus metrics endpoint."""
+    if drift_monitor is not None:
+        set_drift_scores(drift_monitor.scores(), drift_monitor.samples())
     return Response(content=generate_latest(), media_type="text/plain")
 
 @app.get("/")
@@ -151,6 +526,10 @@ async def root():
         "endpoints": {
             "health": "/health",
             "predict": "/predict (POST)",
+            "predict_raw": "/predict/raw (POST)",
+            "predict_array": "/predict/array (POST)",
+            "embed": "/embed (POST)",
+            "similar": "/similar (POST)",
             "metrics": "/metrics"
         }
     }
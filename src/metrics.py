@@ -0,0 +1,182 @@
+"""Prometheus metrics for the inference service.
+
+All instrumentation goes through the helpers below so it can be switched off
+globally with ``METRICS_ENABLED=0``. When disabled the helpers return shared
+no-op objects and never touch a metric.
+"""
+import os
+from contextlib import nullcontext
+
+from prometheus_client import Counter, Gauge, Histogram
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1").lower() not in ("0", "false", "no")
+
+# Request level metrics
+REQUEST_COUNT = Counter('prediction_requests_total', 'Total prediction requests')
+REQUEST_LATENCY = Histogram('prediction_latency_seconds', 'Prediction latency')
+PREDICTION_COUNT = Counter('predictions_by_class', 'Predictions by class', ['class_name'])
+
+# Stage level metrics
+STAGES = ("read", "decode", "transform", "forward", "postprocess")
+STAGE_LATENCY = Histogram(
+    'prediction_stage_latency_seconds', 'Prediction latency by pipeline stage', ['stage'],
+    buckets=(.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1.0, 2.5, 5.0)
+)
+
+# Saturation and input metrics
+IN_FLIGHT = Gauge('prediction_requests_in_flight', 'Prediction requests currently being processed')
+ERROR_TYPES = ("invalid_content_type", "decode_error", "inference_error")
+ERROR_COUNT = Counter('prediction_errors_total', 'Prediction errors by type', ['error_type'])
+IMAGE_BYTES = Histogram(
+    'prediction_image_bytes', 'Uploaded image size in bytes',
+    buckets=(2 ** 14, 2 ** 15, 2 ** 16, 2 ** 17, 2 ** 18, 2 ** 19, 2 ** 20, 2 ** 21, 2 ** 22, 2 ** 23, 2 ** 24)
+)
+RESOLUTION_BUCKETS = (128, 256, 512, 1024, 2048)
+IMAGE_RESOLUTION = Counter(
+    'prediction_image_resolution_total', 'Uploaded images by longest side in pixels', ['bucket']
+)
+
+# Admission control metrics
+SHED_REASONS = ("queue_full", "queue_timeout", "payload_too_large")
+SHED_COUNT = Counter('prediction_requests_shed_total', 'Requests rejected by admission control', ['reason'])
+QUEUE_DEPTH = Gauge('prediction_queue_depth', 'Requests waiting for an admission slot')
+
+# Logging metrics
+LOG_RECORDS_DROPPED = Counter(
+    'prediction_log_records_dropped_total', 'Prediction log records dropped because the log queue was full'
+)
+
+# Cascade metrics
+CASCADE_OUTCOMES = ("stage1", "escalated")
+CASCADE_REQUESTS = Counter(
+    'cascade_requests_total', 'Cascade predictions by outcome (answered by stage1 or escalated)', ['outcome']
+)
+CASCADE_STAGE_LATENCY = Histogram(
+    'cascade_stage_latency_seconds', 'Cascade model latency by stage', ['model_stage'],
+    buckets=(.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1.0, 2.5)
+)
+
+# Similarity search metrics
+SIMILARITY_INDEX_LOAD_SECONDS = Gauge('similarity_index_load_seconds', 'Time taken to load the similarity index')
+SIMILARITY_INDEX_SIZE = Gauge('similarity_index_size', 'Number of images in the similarity index')
+SIMILARITY_QUERY_LATENCY = Histogram(
+    'similarity_query_latency_seconds', 'Top-k search latency over the similarity index',
+    buckets=(.0001, .00025, .0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5)
+)
+
+# Drift metrics, refreshed from the drift monitor on every scrape
+DRIFT_PSI = Gauge('input_drift_psi', 'Population stability index against the training reference profile', ['feature'])
+DRIFT_WINDOW_SAMPLES = Gauge('input_drift_window_samples', 'Predictions covered by the drift scores')
+
+_NULL_CONTEXT = nullcontext()
+
+# Pre-bind label children so the hot path never does a label lookup
+_STAGE_CHILDREN = {stage: STAGE_LATENCY.labels(stage=stage) for stage in STAGES}
+_ERROR_CHILDREN = {error_type: ERROR_COUNT.labels(error_type=error_type) for error_type in ERROR_TYPES}
+_SHED_CHILDREN = {reason: SHED_COUNT.labels(reason=reason) for reason in SHED_REASONS}
+_CASCADE_CHILDREN = {outcome: CASCADE_REQUESTS.labels(outcome=outcome) for outcome in CASCADE_OUTCOMES}
+_CASCADE_STAGE_CHILDREN = {stage: CASCADE_STAGE_LATENCY.labels(model_stage=stage) for stage in ("stage1", "stage2")}
+_RESOLUTION_LABELS = tuple(f"le_{edge}" for edge in RESOLUTION_BUCKETS) + (f"gt_{RESOLUTION_BUCKETS[-1]}",)
+_RESOLUTION_CHILDREN = {label: IMAGE_RESOLUTION.labels(bucket=label) for label in _RESOLUTION_LABELS}
+
+
+def stage_timer(stage):
+    """Context manager timing one pipeline stage."""
+    if not METRICS_ENABLED:
+        return _NULL_CONTEXT
+    return _STAGE_CHILDREN[stage].time()
+
+
+def track_in_flight():
+    """Context manager counting a request as in flight."""
+    if not METRICS_ENABLED:
+        return _NULL_CONTEXT
+    return IN_FLIGHT.track_inprogress()
+
+
+def record_request():
+    """Count an incoming prediction request."""
+    if METRICS_ENABLED:
+        REQUEST_COUNT.inc()
+
+
+def record_prediction(class_name, latency):
+    """Record a successful prediction and its end-to-end latency."""
+    if METRICS_ENABLED:
+        PREDICTION_COUNT.labels(class_name=class_name).inc()
+        REQUEST_LATENCY.observe(latency)
+
+
+def record_error(error_type):
+    """Count a failed prediction by error type."""
+    if METRICS_ENABLED:
+        _ERROR_CHILDREN[error_type].inc()
+
+
+def resolution_bucket(width, height):
+    """Map an image size to a bounded resolution bucket label."""
+    longest = max(width, height)
+    for edge, label in zip(RESOLUTION_BUCKETS, _RESOLUTION_LABELS):
+        if longest <= edge:
+            return label
+    return _RESOLUTION_LABELS[-1]
+
+
+def observe_image(num_bytes, width, height):
+    """Record the byte size and resolution of an uploaded image."""
+    if METRICS_ENABLED:
+        IMAGE_BYTES.observe(num_bytes)
+        _RESOLUTION_CHILDREN[resolution_bucket(width, height)].inc()
+
+
+def record_shed(reason):
+    """Count a request rejected by admission control."""
+    if METRICS_ENABLED:
+        _SHED_CHILDREN[reason].inc()
+
+
+def set_queue_depth(depth):
+    """Publish the number of requests waiting for admission."""
+    if METRICS_ENABLED:
+        QUEUE_DEPTH.set(depth)
+
+
+def record_log_drop():
+    """Count a prediction log record dropped on a full queue."""
+    if METRICS_ENABLED:
+        LOG_RECORDS_DROPPED.inc()
+
+
+def cascade_stage_timer(stage):
+    """Context manager timing one cascade model stage."""
+    if not METRICS_ENABLED:
+        return _NULL_CONTEXT
+    return _CASCADE_STAGE_CHILDREN[stage].time()
+
+
+def record_cascade_outcome(outcome):
+    """Count whether a cascade prediction was answered by stage1 or escalated."""
+    if METRICS_ENABLED:
+        _CASCADE_CHILDREN[outcome].inc()
+
+
+def record_index_load(seconds, size):
+    """Publish how long the similarity index took to load and how many images it holds."""
+    if METRICS_ENABLED:
+        SIMILARITY_INDEX_LOAD_SECONDS.set(seconds)
+        SIMILARITY_INDEX_SIZE.set(size)
+
+
+def similarity_query_timer():
+    """Context manager timing one similarity search."""
+    if not METRICS_ENABLED:
+        return _NULL_CONTEXT
+    return SIMILARITY_QUERY_LATENCY.time()
+
+
+def set_drift_scores(scores, samples):
+    """Publish PSI drift scores per feature."""
+    if METRICS_ENABLED:
+        for feature, score in scores.items():
+            DRIFT_PSI.labels(feature=feature).set(score)
+        DRIFT_WINDOW_SAMPLES.set(samples)
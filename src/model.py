@@ -1,30 +1,130 @@
+import json
+from pathlib import Path
+
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
 
 class CatsDogsCNN(nn.Module):
-    """Simple CNN for binary image classification."""
+    """Simple CNN for binary image classification.
     
-    def __init__(self, num_classes=2):
+    ``channels`` and ``hidden`` default to the original widths; smaller values
+    are produced by structured pruning (see src/prune.py).
+    """
+    
+    def __init__(self, num_classes=2, channels=(32, 64, 128), hidden=512):
         super(CatsDogsCNN, self).__init__()
-        self.conv1 = nn.Conv2d(3, 32, kernel_size=3, padding=1)
-        self.conv2 = nn.Conv2d(32, 64, kernel_size=3, padding=1)
-        self.conv3 = nn.Conv2d(64, 128, kernel_size=3, padding=1)
+        c1, c2, c3 = channels
+        self.channels = (c1, c2, c3)
+        self.hidden = hidden
+        self.conv1 = nn.Conv2d(3, c1, kernel_size=3, padding=1)
+        self.conv2 = nn.Conv2d(c1, c2, kernel_size=3, padding=1)
+        self.conv3 = nn.Conv2d(c2, c3, kernel_size=3, padding=1)
         self.pool = nn.MaxPool2d(2, 2)
-        self.fc1 = nn.Linear(128 * 28 * 28, 512)
-        self.fc2 = nn.Linear(512, num_classes)
+        self.fc1 = nn.Linear(c3 * 28 * 28, hidden)
+        self.fc2 = nn.Linear(hidden, num_classes)
         self.dropout = nn.Dropout(0.5)
         
-    def forward(self, x):
+    def embed(self, x):
+        """Penultimate fc1 activations, used as an image embedding."""
         x = self.pool(F.relu(self.conv1(x)))
         x = self.pool(F.relu(self.conv2(x)))
         x = self.pool(F.relu(self.conv3(x)))
-        x = x.view(-1, 128 * 28 * 28)
-        x = F.relu(self.fc1(x))
+        x = x.view(-1, self.channels[2] * 28 * 28)
+        return F.relu(self.fc1(x))
+        
+    def forward(self, x):
+        x = self.embed(x)
         x = self.dropout(x)
         x = self.fc2(x)
         return x
 
-def get_model(num_classes=2):
+class DepthwiseSeparableConv(nn.Module):
+    """3x3 depthwise conv followed by a 1x1 pointwise conv, each with BN + ReLU."""
+    
+    def __init__(self, in_channels, out_channels, stride=1):
+        super(DepthwiseSeparableConv, self).__init__()
+        self.depthwise = nn.Conv2d(in_channels, in_channels, kernel_size=3, stride=stride,
+                                   padding=1, groups=in_channels, bias=False)
+        self.bn1 = nn.BatchNorm2d(in_channels)
+        self.pointwise = nn.Conv2d(in_channels, out_channels, kernel_size=1, bias=False)
+        self.bn2 = nn.BatchNorm2d(out_channels)
+    
+    def forward(self, x):
+        x = F.relu(self.bn1(self.depthwise(x)))
+        return F.relu(self.bn2(self.pointwise(x)))
+
+class CompactCatsDogsCNN(nn.Module):
+    """Depthwise-separable CNN with a global average pooled head.
+    
+    About 300x fewer parameters than CatsDogsCNN and independent of the
+    input resolution, since the head never flattens a spatial feature map.
+    """
+    
+    def __init__(self, num_classes=2):
+        super(CompactCatsDogsCNN, self).__init__()
+        self.stem = nn.Sequential(
+            nn.Conv2d(3, 32, kernel_size=3, stride=2, padding=1, bias=False),
+            nn.BatchNorm2d(32),
+            nn.ReLU(inplace=True),
+        )
+        self.blocks = nn.Sequential(
+            DepthwiseSeparableConv(32, 64, stride=2),
+            DepthwiseSeparableConv(64, 128, stride=2),
+            DepthwiseSeparableConv(128, 128),
+            DepthwiseSeparableConv(128, 256, stride=2),
+            DepthwiseSeparableConv(256, 256),
+        )
+        self.global_pool = nn.AdaptiveAvgPool2d(1)
+        self.fc1 = nn.Linear(256, 128)
+        self.fc2 = nn.Linear(128, num_classes)
+        self.dropout = nn.Dropout(0.2)
+    
+    def embed(self, x):
+        """Penultimate fc1 activations, used as an image embedding."""
+        x = self.blocks(self.stem(x))
+        x = torch.flatten(self.global_pool(x), 1)
+        return F.relu(self.fc1(x))
+    
+    def forward(self, x):
+        x = self.embed(x)
+        x = self.dropout(x)
+        x = self.fc2(x)
+        return x
+
+ARCHITECTURES = {
+    "cnn": CatsDogsCNN,
+    "compact": CompactCatsDogsCNN,
+}
+
+def get_model(num_classes=2, arch="cnn", **kwargs):
     """Factory function to create model."""
-    return CatsDogsCNN(num_classes=num_classes)
+    if arch not in ARCHITECTURES:
+        raise ValueError(f"Unknown architecture '{arch}', expected one of {sorted(ARCHITECTURES)}")
+    return ARCHITECTURES[arch](num_classes=num_classes, **kwargs)
+
+def save_model_config(path, arch="cnn", **kwargs):
+    """Save the architecture name and constructor arguments next to the weights."""
+    with open(path, "w") as f:
+        json.dump({"arch": arch, **kwargs}, f, indent=2)
+
+def build_model_from_config(config, num_classes=2):
+    """Create a model from a saved config, returning it with its input size."""
+    config = dict(config)
+    image_size = tuple(config.pop("image_size", (224, 224)))
+    return get_model(num_classes=num_classes, **config), image_size
+
+def load_model_config(path):
+    """Load a config written by save_model_config, defaulting to the original CNN."""
+    path = Path(path)
+    if not path.exists():
+        return {"arch": "cnn"}
+    with open(path, "r") as f:
+        return json.load(f)
+
+def load_checkpoint(model_dir, num_classes=2, map_location="cpu"):
+    """Load a model saved by train_model, returning it with its input size."""
+    model_dir = Path(model_dir)
+    model, image_size = build_model_from_config(load_model_config(model_dir / "model_config.json"), num_classes)
+    model.load_state_dict(torch.load(model_dir / "model.pth", map_location=map_location))
+    return model.eval(), image_size
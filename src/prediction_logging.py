@@ -0,0 +1,111 @@
+"""Non-blocking, sampled, structured prediction logging.
+
+Prediction records are JSON objects pushed onto a bounded in-memory queue and
+written by a background ``QueueListener`` thread, so the request path never
+formats or writes log lines itself. Only a sample of successful predictions is
+logged; errors and low-confidence predictions are always logged. Records that
+do not fit in the queue are dropped and counted.
+"""
+import json
+import logging
+import os
+import queue
+import random
+import sys
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+from src.metrics import record_log_drop
+
+SAMPLE_RATE = float(os.getenv("PREDICTION_LOG_SAMPLE_RATE", "0.01"))
+LOW_CONFIDENCE = float(os.getenv("PREDICTION_LOG_LOW_CONFIDENCE", "0.6"))
+QUEUE_SIZE = int(os.getenv("PREDICTION_LOG_QUEUE_SIZE", "10000"))
+
+
+class DroppingQueueHandler(QueueHandler):
+    """Queue handler that never blocks and counts records it has to drop."""
+
+    def prepare(self, record):
+        # Formatting happens on the listener thread, not the request path
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            record_log_drop()
+
+
+class JsonFormatter(logging.Formatter):
+    """Format records as one JSON object per line."""
+
+    def format(self, record):
+        entry = {
+            "timestamp": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        entry.update(getattr(record, "fields", {}))
+        return json.dumps(entry)
+
+
+class PredictionSampler:
+    """Decide which successful predictions are worth logging."""
+
+    def __init__(self, sample_rate=SAMPLE_RATE, low_confidence=LOW_CONFIDENCE):
+        self.sample_rate = sample_rate
+        self.low_confidence = low_confidence
+
+    def should_log(self, confidence):
+        return confidence < self.low_confidence or random.random() < self.sample_rate
+
+
+prediction_logger = logging.getLogger("prediction")
+prediction_logger.setLevel(logging.INFO)
+prediction_logger.propagate = False
+
+sampler = PredictionSampler()
+_queue = queue.Queue(maxsize=QUEUE_SIZE)
+_listener = None
+
+prediction_logger.addHandler(DroppingQueueHandler(_queue))
+
+
+def start_prediction_logging(stream=None):
+    """Start the background thread writing prediction records."""
+    global _listener
+    if _listener is not None:
+        return
+    handler = logging.StreamHandler(stream or sys.stdout)
+    handler.setFormatter(JsonFormatter())
+    _listener = QueueListener(_queue, handler, respect_handler_level=False)
+    _listener.start()
+
+
+def stop_prediction_logging():
+    """Flush queued records and stop the background thread."""
+    global _listener
+    if _listener is None:
+        return
+    _listener.stop()
+    _listener = None
+
+
+def log_prediction(result, **fields):
+    """Log a successful prediction if it is sampled."""
+    if not sampler.should_log(result["confidence"]):
+        return
+    fields.update(
+        event="prediction",
+        prediction=result["prediction"],
+        confidence=round(result["confidence"], 4),
+        latency_seconds=round(result["latency_seconds"], 6),
+    )
+    prediction_logger.info("prediction", extra={"fields": fields})
+
+
+def log_prediction_error(error_type, detail, **fields):
+    """Log a failed prediction; errors are never sampled out."""
+    fields.update(event="prediction_error", error_type=error_type, detail=detail)
+    prediction_logger.error("prediction_error", extra={"fields": fields})
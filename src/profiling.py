@@ -0,0 +1,213 @@
+"""On-demand profiling of the live inference server.
+
+A capture runs a ``torch.profiler`` trace and a Python stack sampler for the
+next N requests or T seconds, whichever comes first, and returns a Chrome
+trace (chrome://tracing, Perfetto) and folded stacks (flamegraph.pl,
+speedscope). Both observe every thread in the process rather than the caller,
+so work done in the threadpool, or in any executor or batching thread added
+later, is included. Torch versions without all-thread profiling only trace
+the thread that started the profiler; there the profiler is started in a
+dedicated worker thread and work passed to ``Profiler.run`` executes in that
+thread for the duration of the capture, serializing it. Nothing is installed
+unless an admin token is configured, and between captures the middleware
+costs one attribute check per request.
+"""
+import asyncio
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import torch
+from fastapi.concurrency import run_in_threadpool
+from torch.profiler import ProfilerActivity, profile
+
+logger = logging.getLogger(__name__)
+
+PROFILE_FORMATS = ("json", "chrome", "folded")
+
+
+class ProfilerBusy(Exception):
+    """Raised when a capture is requested while another one is running."""
+
+
+def _frame_stack(frame):
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+        frame = frame.f_back
+    stack.reverse()
+    return stack
+
+
+class StackSampler:
+    """Background thread sampling the Python stacks of all other threads."""
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.counts = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = [names.get(thread_id, str(thread_id))] + _frame_stack(frame)
+                self.counts[";".join(stack)] += 1
+            self.samples += 1
+
+    def folded(self):
+        """Samples in folded-stack format: ``frame;frame;frame count`` per line."""
+        return "\n".join(f"{stack} {count}" for stack, count in self.counts.most_common())
+
+
+def _torch_profiler():
+    """A torch profiler and whether it observes every thread."""
+    activities = [ProfilerActivity.CPU]
+    if torch.cuda.is_available():
+        activities.append(ProfilerActivity.CUDA)
+    try:
+        config = torch._C._profiler._ExperimentalConfig(profile_all_threads=True)
+        return profile(activities=activities, record_shapes=True, experimental_config=config), True
+    except TypeError:
+        logger.warning("This torch version cannot profile all threads, model work runs in one profiled "
+                       "thread during the capture")
+        return profile(activities=activities, record_shapes=True), False
+
+
+class ProfileSession:
+    """One capture: a torch trace plus Python stack samples."""
+
+    def __init__(self, max_requests=None, sample_interval=0.005):
+        self.max_requests = max_requests
+        self.requests = 0
+        self.duration = None
+        self.done = asyncio.Event()
+        self._torch_profiler, all_threads = _torch_profiler()
+        # Without all-thread support the profiler only sees the thread it was started in
+        self.executor = None if all_threads else ThreadPoolExecutor(1, thread_name_prefix="profiled-worker")
+        self._sampler = StackSampler(sample_interval)
+
+    def _in_profiled_thread(self, func):
+        if self.executor is None:
+            func()
+        else:
+            self.executor.submit(func).result()
+
+    def start(self):
+        self._start_time = time.perf_counter()
+        self._in_profiled_thread(self._torch_profiler.start)
+        self._sampler.start()
+
+    def stop(self):
+        self._sampler.stop()
+        # Queued behind any work already submitted, so that work is still traced
+        self._in_profiled_thread(self._torch_profiler.stop)
+        if self.executor is not None:
+            self.executor.shutdown()
+        self.duration = time.perf_counter() - self._start_time
+
+    def record_request(self):
+        self.requests += 1
+        if self.max_requests and self.requests >= self.max_requests:
+            self.done.set()
+
+    def chrome_trace(self):
+        """The torch trace as a Chrome trace event document."""
+        fd, path = tempfile.mkstemp(suffix=".json")
+        os.close(fd)
+        try:
+            self._torch_profiler.export_chrome_trace(path)
+            with open(path, "r") as f:
+                return json.load(f)
+        finally:
+            os.remove(path)
+
+    def folded_stacks(self):
+        return self._sampler.folded()
+
+    def summary(self):
+        return {
+            "requests": self.requests,
+            "duration_seconds": self.duration,
+            "python_samples": self._sampler.samples,
+        }
+
+
+class Profiler:
+    """Runs at most one capture at a time and exposes it to the middleware."""
+
+    def __init__(self):
+        self.session = None
+        self._capturing = False
+
+    async def run(self, func, *args):
+        """Run blocking work off the event loop, in the profiled thread when a capture needs it."""
+        session = self.session
+        if session is None or session.executor is None:
+            return await run_in_threadpool(func, *args)
+        return await asyncio.wrap_future(session.executor.submit(func, *args))
+
+    async def capture(self, max_requests=None, seconds=30.0, sample_interval=0.005):
+        """Profile until ``max_requests`` requests complete or ``seconds`` pass.
+
+        Starting and stopping the profilers can take a while (stopping waits for
+        queued model work and processes the trace), so both run in the
+        threadpool to keep the event loop, and health checks, responsive.
+        """
+        if self._capturing:
+            raise ProfilerBusy("A profile is already being captured")
+        self._capturing = True
+        try:
+            session = ProfileSession(max_requests, sample_interval)
+            await run_in_threadpool(session.start)
+            self.session = session
+            try:
+                await asyncio.wait_for(session.done.wait(), timeout=seconds)
+            except asyncio.TimeoutError:
+                pass
+            finally:
+                self.session = None
+                await run_in_threadpool(session.stop)
+        finally:
+            self._capturing = False
+        return session
+
+
+class ProfilingMiddleware:
+    """Counts completed requests on guarded paths towards the active capture."""
+
+    def __init__(self, app, profiler, paths=("/predict",)):
+        self.app = app
+        self.profiler = profiler
+        self.paths = tuple(paths)
+
+    async def __call__(self, scope, receive, send):
+        session = self.profiler.session
+        if session is None or scope["type"] != "http" or not scope["path"].startswith(self.paths):
+            await self.app(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            session.record_request()
@@ -0,0 +1,181 @@
+"""Structured pruning of CatsDogsCNN.
+
+Removes whole conv filters and fc1 neurons ranked by L1 norm, then rebuilds a
+smaller dense CatsDogsCNN (no masks) with the surviving weights copied over.
+The same keep fraction is applied to every layer and chosen by bisection so
+the pruned model hits a target FLOP or parameter ratio. The pruned model is
+fine-tuned briefly with train_epoch and saved with its widths in
+model_config.json so load_model can serve it.
+
+Usage:
+  python src/prune.py --model-dir models --output-dir models/pruned --target 0.25 --metric params
+  MODEL_DIR=models/pruned uvicorn src.inference:app
+"""
+import argparse
+import os
+import shutil
+import sys
+
+import mlflow
+import torch
+import torch.nn as nn
+import torch.optim as optim
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.compare_models import count_parameters, model_size_bytes, measure_latency
+from src.data_preprocessing import prepare_dataloaders
+from src.model import CatsDogsCNN, load_checkpoint, load_model_config, save_model_config
+from src.train import train_epoch, validate
+
+FEATURE_SIZE = 28 * 28
+
+def cnn_cost(channels, hidden, num_classes=2, metric="flops", image_size=224):
+    """Analytical parameter count or multiply-accumulates of a CatsDogsCNN."""
+    c1, c2, c3 = channels
+    conv_shapes = [(3, c1, image_size), (c1, c2, image_size // 2), (c2, c3, image_size // 4)]
+    fc_shapes = [(c3 * FEATURE_SIZE, hidden), (hidden, num_classes)]
+    if metric == "params":
+        conv = sum(cin * cout * 9 + cout for cin, cout, _ in conv_shapes)
+        fc = sum(fin * fout + fout for fin, fout in fc_shapes)
+    elif metric == "flops":
+        conv = sum(cin * cout * 9 * size * size for cin, cout, size in conv_shapes)
+        fc = sum(fin * fout for fin, fout in fc_shapes)
+    else:
+        raise ValueError(f"Unknown metric '{metric}', expected 'flops' or 'params'")
+    return conv + fc
+
+def pruned_widths(channels, hidden, keep):
+    """Layer widths after keeping a fraction of every layer (at least one unit)."""
+    return tuple(max(1, round(c * keep)) for c in channels), max(1, round(hidden * keep))
+
+def keep_fraction_for_target(channels, hidden, target, metric="flops", num_classes=2):
+    """Largest uniform keep fraction whose cost ratio is at most ``target``."""
+    full = cnn_cost(channels, hidden, num_classes, metric)
+    low, high = 0.0, 1.0
+    for _ in range(30):
+        mid = (low + high) / 2
+        widths, width_hidden = pruned_widths(channels, hidden, mid)
+        if cnn_cost(widths, width_hidden, num_classes, metric) / full <= target:
+            low = mid
+        else:
+            high = mid
+    return low
+
+def _top_indices(scores, keep):
+    return torch.sort(torch.topk(scores, keep).indices).values
+
+def prune_cnn(model, keep):
+    """Return a new, physically smaller CatsDogsCNN keeping the strongest units."""
+    if not isinstance(model, CatsDogsCNN):
+        raise ValueError("Structured pruning is only implemented for the 'cnn' architecture")
+    (k1, k2, k3), k_hidden = pruned_widths(model.channels, model.hidden, keep)
+    num_classes = model.fc2.out_features
+
+    # Rank each conv filter by the L1 norm of its own kernel and each fc1 neuron by its input weights
+    idx1 = _top_indices(model.conv1.weight.detach().abs().sum(dim=(1, 2, 3)), k1)
+    idx2 = _top_indices(model.conv2.weight.detach().abs().sum(dim=(1, 2, 3)), k2)
+    idx3 = _top_indices(model.conv3.weight.detach().abs().sum(dim=(1, 2, 3)), k3)
+    idx_hidden = _top_indices(model.fc1.weight.detach().abs().sum(dim=1), k_hidden)
+
+    pruned = CatsDogsCNN(num_classes=num_classes, channels=(k1, k2, k3), hidden=k_hidden)
+    with torch.no_grad():
+        pruned.conv1.weight.copy_(model.conv1.weight[idx1])
+        pruned.conv1.bias.copy_(model.conv1.bias[idx1])
+        pruned.conv2.weight.copy_(model.conv2.weight[idx2][:, idx1])
+        pruned.conv2.bias.copy_(model.conv2.bias[idx2])
+        pruned.conv3.weight.copy_(model.conv3.weight[idx3][:, idx2])
+        pruned.conv3.bias.copy_(model.conv3.bias[idx3])
+        # fc1 inputs are the flattened (channel, 28, 28) map, keep whole channel blocks
+        fc1_weight = model.fc1.weight.view(model.hidden, model.channels[2], FEATURE_SIZE)
+        pruned.fc1.weight.copy_(fc1_weight[idx_hidden][:, idx3].reshape(k_hidden, k3 * FEATURE_SIZE))
+        pruned.fc1.bias.copy_(model.fc1.bias[idx_hidden])
+        pruned.fc2.weight.copy_(model.fc2.weight[:, idx_hidden])
+        pruned.fc2.bias.copy_(model.fc2.bias)
+    return pruned
+
+def describe(model, test_loader, device):
+    """Size, latency and (if data is available) accuracy of a model."""
+    stats = {
+        "param_count": count_parameters(model),
+        "model_size_mb": model_size_bytes(model) / (1024 * 1024),
+        "flops": cnn_cost(model.channels, model.hidden, model.fc2.out_features, "flops"),
+        "latency_b1_p50_ms": measure_latency(model)["p50_ms"],
+    }
+    if test_loader is not None:
+        model.to(device)
+        _, stats["test_accuracy"], _, _ = validate(model, test_loader, nn.CrossEntropyLoss(), device)
+    return stats
+
+def prune_model(model_dir='models', output_dir='models/pruned', target=0.25, metric='flops',
+                data_dir='data/processed', finetune_epochs=1, lr=0.0005, batch_size=32, max_batches=50):
+    """Prune a trained model, fine-tune it, save it and log before/after to MLflow."""
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    classes_path = os.path.join(model_dir, "classes.txt")
+    num_classes = 2
+    if os.path.exists(classes_path):
+        with open(classes_path, "r") as f:
+            num_classes = len([line for line in f.read().splitlines() if line.strip()])
+
+    model, image_size = load_checkpoint(model_dir, num_classes=num_classes)
+    keep = keep_fraction_for_target(model.channels, model.hidden, target, metric, num_classes)
+    print(f"Keeping {keep * 100:.1f}% of each layer to reach {metric} ratio <= {target}")
+
+    train_loader = test_loader = None
+    if os.path.isdir(data_dir):
+        train_loader, _, test_loader, _ = prepare_dataloaders(data_dir, batch_size=batch_size, image_size=image_size)
+    else:
+        print(f"Data directory {data_dir} not found, skipping fine-tuning and accuracy")
+
+    before = describe(model, test_loader, device)
+    pruned = prune_cnn(model.cpu(), keep)
+
+    if train_loader is not None and finetune_epochs > 0:
+        pruned.to(device)
+        criterion = nn.CrossEntropyLoss()
+        optimizer = optim.Adam(pruned.parameters(), lr=lr)
+        for epoch in range(finetune_epochs):
+            print(f"\nFine-tuning epoch {epoch+1}/{finetune_epochs}")
+            train_loss, train_acc = train_epoch(pruned, train_loader, criterion, optimizer, device, max_batches)
+            print(f"Train Loss: {train_loss:.4f}, Train Acc: {train_acc:.2f}%")
+    pruned.cpu().eval()
+    after = describe(pruned, test_loader, device)
+
+    # Save in the layout load_model expects
+    os.makedirs(output_dir, exist_ok=True)
+    torch.save(pruned.cpu().state_dict(), os.path.join(output_dir, "model.pth"))
+    config = load_model_config(os.path.join(model_dir, "model_config.json"))
+    config.update(channels=list(pruned.channels), hidden=pruned.hidden, image_size=list(image_size))
+    save_model_config(os.path.join(output_dir, "model_config.json"), **config)
+    if os.path.exists(classes_path):
+        shutil.copy(classes_path, os.path.join(output_dir, "classes.txt"))
+
+    mlflow.set_experiment("cats-dogs-pruning")
+    with mlflow.start_run():
+        mlflow.log_params({"target": target, "metric": metric, "keep_fraction": keep,
+                           "finetune_epochs": finetune_epochs, "channels": list(pruned.channels),
+                           "hidden": pruned.hidden})
+        mlflow.log_metrics({f"before_{name}": value for name, value in before.items()})
+        mlflow.log_metrics({f"after_{name}": value for name, value in after.items()})
+        mlflow.log_artifact(os.path.join(output_dir, "model_config.json"))
+
+    print(f"\n{'':<20} {'before':>14} {'after':>14}")
+    for name in before:
+        print(f"{name:<20} {before[name]:>14,.2f} {after.get(name, float('nan')):>14,.2f}")
+    print(f"\nPruned model saved to {output_dir}")
+    return pruned, before, after
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Structured pruning of CatsDogsCNN")
+    parser.add_argument("--model-dir", default="models", help="Directory with the trained model")
+    parser.add_argument("--output-dir", default="models/pruned")
+    parser.add_argument("--target", type=float, default=0.25, help="Target cost ratio, e.g. 0.25 keeps 25%%")
+    parser.add_argument("--metric", choices=["flops", "params"], default="flops")
+    parser.add_argument("--data-dir", default="data/processed")
+    parser.add_argument("--finetune-epochs", type=int, default=1)
+    parser.add_argument("--lr", type=float, default=0.0005)
+    parser.add_argument("--batch-size", type=int, default=32)
+    args = parser.parse_args()
+
+    prune_model(args.model_dir, args.output_dir, args.target, args.metric, args.data_dir,
+                args.finetune_epochs, args.lr, args.batch_size)
@@ -0,0 +1,138 @@
+"""Embedding index and vectorized top-k cosine search.
+
+An index directory written by src/build_index.py holds:
+  embeddings.npy  N x D matrix of L2-normalized embeddings, float32 or int8
+  scales.npy      per-row dequantization scales, only for int8 indexes
+  pca.npz         optional mean and components projecting embeddings to D dims
+  paths.txt       the image path of each row
+  index.json      metadata (count, dims, dtype, model directory)
+
+The matrix is opened with ``np.load(mmap_mode="r")``, so loading does not
+depend on the index size and the pages are shared between worker processes.
+Search scores the matrix in chunks with one matrix product per chunk and keeps
+a running top-k with ``np.argpartition``. int8 chunks are dequantized to
+float32 for the product, so they are kept small to bound per-request memory.
+"""
+import json
+from pathlib import Path
+
+import numpy as np
+
+INDEX_META = "index.json"
+EMBEDDINGS_FILE = "embeddings.npy"
+SCALES_FILE = "scales.npy"
+PCA_FILE = "pca.npz"
+PATHS_FILE = "paths.txt"
+# Rows dequantized at once by an int8 search, 8 MB of float32 at 512 dims
+INT8_CHUNK_SIZE = 4096
+
+
+def normalize(vectors):
+    """L2-normalize along the last axis, leaving zero vectors at zero."""
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def project(embeddings, pca_mean=None, pca_components=None):
+    """Normalize model embeddings and, if given, reduce them with PCA."""
+    vectors = normalize(np.asarray(embeddings, dtype=np.float32))
+    if pca_components is not None:
+        vectors = normalize((vectors - pca_mean) @ pca_components.T)
+    return vectors.astype(np.float32, copy=False)
+
+
+def fit_pca(sample, dim):
+    """Mean and top ``dim`` principal components of a sample of rows."""
+    if dim >= sample.shape[1]:
+        raise ValueError(f"PCA dimension {dim} must be smaller than the embedding size {sample.shape[1]}")
+    mean = sample.mean(axis=0)
+    _, _, components = np.linalg.svd(sample - mean, full_matrices=False)
+    return mean.astype(np.float32), components[:dim].astype(np.float32)
+
+
+def quantize_int8(vectors):
+    """Symmetric per-row int8 quantization, returning (values, scales)."""
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    values = np.round(vectors / scales[:, None]).astype(np.int8)
+    return values, scales.astype(np.float32)
+
+
+class EmbeddingIndex:
+    """In-memory (or memory-mapped) embedding matrix with top-k cosine search."""
+
+    def __init__(self, vectors, paths, scales=None, pca_mean=None, pca_components=None,
+                 chunk_size=65536):
+        if len(paths) != len(vectors):
+            raise ValueError(f"Index has {len(vectors)} vectors but {len(paths)} paths")
+        self.vectors = vectors
+        self.paths = paths
+        self.scales = scales
+        self.pca_mean = pca_mean
+        self.pca_components = pca_components
+        self.chunk_size = chunk_size
+
+    @classmethod
+    def load(cls, index_dir, mmap=True):
+        """Open an index directory written by build_index."""
+        index_dir = Path(index_dir)
+        vectors = np.load(index_dir / EMBEDDINGS_FILE, mmap_mode="r" if mmap else None)
+        scales = None
+        if (index_dir / SCALES_FILE).exists():
+            scales = np.load(index_dir / SCALES_FILE)
+        pca_mean = pca_components = None
+        if (index_dir / PCA_FILE).exists():
+            with np.load(index_dir / PCA_FILE) as pca:
+                pca_mean, pca_components = pca["mean"], pca["components"]
+        with open(index_dir / PATHS_FILE, "r") as f:
+            paths = f.read().splitlines()
+        return cls(vectors, paths, scales, pca_mean, pca_components)
+
+    def __len__(self):
+        return len(self.vectors)
+
+    @property
+    def dim(self):
+        return self.vectors.shape[1]
+
+    def search(self, embeddings, k=5):
+        """Top-k most similar images for each query embedding.
+
+        ``embeddings`` are raw model embeddings, one per row (or a single
+        vector). Returns one list of ``(path, cosine_score)`` per query,
+        best first.
+        """
+        queries = project(np.atleast_2d(embeddings), self.pca_mean, self.pca_components)
+        k = min(k, len(self))
+        chunk_size = self.chunk_size if self.scales is None else min(self.chunk_size, INT8_CHUNK_SIZE)
+        best_scores = np.full((len(queries), 0), -np.inf, dtype=np.float32)
+        best_indices = np.zeros((len(queries), 0), dtype=np.int64)
+
+        for start in range(0, len(self), chunk_size):
+            block = self.vectors[start:start + chunk_size]
+            if self.scales is None:
+                scores = queries @ np.asarray(block).T
+            else:
+                scores = (queries @ block.T.astype(np.float32)) * self.scales[start:start + len(block)]
+            indices = np.broadcast_to(np.arange(start, start + len(block)), scores.shape)
+            scores = np.concatenate([best_scores, scores], axis=1)
+            indices = np.concatenate([best_indices, indices], axis=1)
+            if scores.shape[1] > k:
+                top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+                scores = np.take_along_axis(scores, top, axis=1)
+                indices = np.take_along_axis(indices, top, axis=1)
+            best_scores, best_indices = scores, indices
+
+        order = np.argsort(-best_scores, axis=1)
+        best_scores = np.take_along_axis(best_scores, order, axis=1)
+        best_indices = np.take_along_axis(best_indices, order, axis=1)
+        return [
+            [(self.paths[i], float(score)) for i, score in zip(row_indices, row_scores)]
+            for row_indices, row_scores in zip(best_indices, best_scores)
+        ]
+
+
+def load_index_meta(index_dir):
+    """Read the metadata written next to an index."""
+    with open(Path(index_dir) / INDEX_META, "r") as f:
+        return json.load(f)
@@ -5,15 +5,16 @@ import torch.nn as nn
 import torch.optim as optim
 import mlflow
 import mlflow.pytorch
-from sklearn.metrics import confusion_matrix, classification_report
-import matplotlib.pyplot as plt
-import numpy as np
 from pathlib import Path
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from src.data_preprocessing import prepare_dataloaders
-from src.model import get_model
+from src.drift import (
+    REFERENCE_PROFILE, new_sketches, profile_image_files, profile_predictions, save_reference_profile
+)
+from src.evaluate import evaluate, render_figures_async
+from src.model import get_model, save_model_config
 
 def train_epoch(model, loader, criterion, optimizer, device, max_batches=None):
     """Train for one epoch."""
@@ -69,35 +70,24 @@ def validate(model, loader, criterion, device, max_batches=None):
     
     return running_loss / min(len(loader), max_batches or len(loader)), 100. * correct / total, all_preds, all_labels
 
-def plot_confusion_matrix(y_true, y_pred, classes):
-    """Plot confusion matrix."""
-    cm = confusion_matrix(y_true, y_pred)
-    fig, ax = plt.subplots(figsize=(8, 6))
-    im = ax.imshow(cm, interpolation='nearest', cmap=plt.cm.Blues)
-    ax.figure.colorbar(im, ax=ax)
-    ax.set(xticks=np.arange(cm.shape[1]), yticks=np.arange(cm.shape[0]),
-           xticklabels=classes, yticklabels=classes,
-           ylabel='True label', xlabel='Predicted label')
-    plt.setp(ax.get_xticklabels(), rotation=45, ha="right", rotation_mode="anchor")
-    
-    for i in range(cm.shape[0]):
-        for j in range(cm.shape[1]):
-            ax.text(j, i, format(cm[i, j], 'd'),
-                   ha="center", va="center",
-                   color="white" if cm[i, j] > cm.max() / 2. else "black")
-    fig.tight_layout()
-    return fig
-
-def train_model(data_dir='data/processed', epochs=10, batch_size=32, lr=0.001, max_samples=None):
+def train_model(data_dir='data/processed', epochs=10, batch_size=32, lr=0.001, max_samples=None,
+                arch='cnn', model_dir='models', image_size=(224, 224), reference_images=None):
     """Main training function with MLflow tracking."""
     
     mlflow.set_experiment("cats-dogs-classification")
+    os.makedirs(model_dir, exist_ok=True)
+    best_model_path = os.path.join(model_dir, "best_model.pth")
+    model_path = os.path.join(model_dir, "model.pth")
     
     with mlflow.start_run():
         # Log parameters
-        mlflow.log_param("epochs", epochs)
-        mlflow.log_param("batch_size", batch_size)
-        mlflow.log_param("learning_rate", lr)
+        mlflow.log_params({
+            "epochs": epochs,
+            "batch_size": batch_size,
+            "learning_rate": lr,
+            "arch": arch,
+            "image_size": image_size[0],
+        })
         
         # Setup
         device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
@@ -106,13 +96,13 @@ def train_model(data_dir='data/processed', epochs=10, batch_size=32, lr=0.001, m
         
         # Data
         train_loader, val_loader, test_loader, classes = prepare_dataloaders(
-            data_dir, batch_size=batch_size
+            data_dir, batch_size=batch_size, image_size=image_size
         )
         mlflow.log_param("num_classes", len(classes))
         print(f"Dataset loaded: {len(train_loader.dataset)} train, {len(val_loader.dataset)} val, {len(test_loader.dataset)} test")
         
         # Model
-        model = get_model(num_classes=len(classes)).to(device)
+        model = get_model(num_classes=len(classes), arch=arch).to(device)
         criterion = nn.CrossEntropyLoss()
         optimizer = optim.Adam(model.parameters(), lr=lr)
         
@@ -132,50 +122,62 @@ def train_model(data_dir='data/processed', epochs=10, batch_size=32, lr=0.001, m
             
             print(f"Train Loss: {train_loss:.4f}, Train Acc: {train_acc:.2f}% | Val Loss: {val_loss:.4f}, Val Acc: {val_acc:.2f}%")
             
-            mlflow.log_metric("train_loss", train_loss, step=epoch)
-            mlflow.log_metric("train_accuracy", train_acc, step=epoch)
-            mlflow.log_metric("val_loss", val_loss, step=epoch)
-            mlflow.log_metric("val_accuracy", val_acc, step=epoch)
+            mlflow.log_metrics({
+                "train_loss": train_loss,
+                "train_accuracy": train_acc,
+                "val_loss": val_loss,
+                "val_accuracy": val_acc,
+            }, step=epoch)
             
             if val_acc > best_val_acc:
                 best_val_acc = val_acc
-                torch.save(model.state_dict(), "models/best_model.pth")
+                torch.save(model.state_dict(), best_model_path)
         
-        # Test evaluation
-        model.load_state_dict(torch.load("models/best_model.pth"))
-        test_loss, test_acc, test_preds, test_labels = validate(model, test_loader, criterion, device, max_batches)
+        # Test evaluation over the full split; figures render in a background process
+        model.load_state_dict(torch.load(best_model_path))
+        evaluation_dir = os.path.join(model_dir, "evaluation")
+        evaluation = evaluate(model, test_loader, device, classes, evaluation_dir)
+        test_acc = evaluation["metrics"]["test_accuracy"]
+        figures = render_figures_async(evaluation_dir, evaluation["labels"], evaluation["predictions"], classes,
+                                       train_losses, val_losses)
         
         print(f"\nTest Accuracy: {test_acc:.2f}%")
-        mlflow.log_metric("test_accuracy", test_acc)
-        
-        # Confusion matrix
-        cm_fig = plot_confusion_matrix(test_labels, test_preds, classes)
-        mlflow.log_figure(cm_fig, "confusion_matrix.png")
-        plt.close()
+        mlflow.log_metrics(evaluation["metrics"])
         
-        # Loss curves
-        fig, ax = plt.subplots()
-        ax.plot(train_losses, label='Train Loss')
-        ax.plot(val_losses, label='Val Loss')
-        ax.set_xlabel('Epoch')
-        ax.set_ylabel('Loss')
-        ax.legend()
-        mlflow.log_figure(fig, "loss_curves.png")
-        plt.close()
+        # Reference profile for drift monitoring in the service
+        sketches = profile_predictions(model, val_loader, device, new_sketches(len(classes)))
+        if reference_images and os.path.isdir(reference_images):
+            profile_image_files(reference_images, sketches)
+        profile_path = os.path.join(model_dir, REFERENCE_PROFILE)
+        save_reference_profile(profile_path, sketches, classes)
+        mlflow.log_artifact(profile_path)
         
         # Save model
         mlflow.pytorch.log_model(model, "model")
-        torch.save(model.state_dict(), "models/model.pth")
+        torch.save(model.state_dict(), model_path)
         
-        # Save class names
-        with open("models/classes.txt", "w") as f:
+        # Save class names and architecture
+        classes_path = os.path.join(model_dir, "classes.txt")
+        with open(classes_path, "w") as f:
             f.write("\n".join(classes))
-        mlflow.log_artifact("models/classes.txt")
+        mlflow.log_artifact(classes_path)
+        config_path = os.path.join(model_dir, "model_config.json")
+        save_model_config(config_path, arch=arch, image_size=list(image_size))
+        mlflow.log_artifact(config_path)
         
-        print(f"\nModel saved to models/model.pth")
+        # Per-sample predictions, confusion matrix and loss curves in one upload
+        figures.result()
+        mlflow.log_artifacts(evaluation_dir)
+        
+        print(f"\nModel saved to {model_path}")
         print(f"Best validation accuracy: {best_val_acc:.2f}%")
+        
+        return model, test_acc
 
 if __name__ == "__main__":
     os.makedirs("models", exist_ok=True)
     # Quick training for demo (reduce epochs for faster execution)
-    train_model(data_dir="data/processed", epochs=3, batch_size=32, lr=0.001)
+    image_size = int(os.getenv("MODEL_IMAGE_SIZE", "224"))
+    train_model(data_dir="data/processed", epochs=3, batch_size=32, lr=0.001,
+                arch=os.getenv("MODEL_ARCH", "cnn"), model_dir=os.getenv("MODEL_DIR", "models"),
+                image_size=(image_size, image_size), reference_images=os.getenv("REFERENCE_IMAGES_DIR", "data/raw"))
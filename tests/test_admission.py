@@ -0,0 +1,84 @@
+import asyncio
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from src.admission import AdmissionController, AdmissionMiddleware, Overloaded
+
+def test_controller_rejects_when_queue_full():
+    """Test requests beyond in-flight and queue capacity are shed."""
+    async def scenario():
+        controller = AdmissionController(max_in_flight=1, max_queue=0, queue_timeout=1.0)
+        await controller.acquire()
+        with pytest.raises(Overloaded) as exc_info:
+            await controller.acquire()
+        return exc_info.value.reason
+    
+    assert asyncio.run(scenario()) == "queue_full"
+
+def test_controller_times_out_queued_request():
+    """Test queued requests are shed once their deadline passes."""
+    async def scenario():
+        controller = AdmissionController(max_in_flight=1, max_queue=1, queue_timeout=0.01)
+        await controller.acquire()
+        with pytest.raises(Overloaded) as exc_info:
+            await controller.acquire()
+        return exc_info.value.reason, controller.queue_depth
+    
+    reason, depth = asyncio.run(scenario())
+    assert reason == "queue_timeout"
+    assert depth == 0, "Timed out waiter should leave the queue"
+
+def test_controller_hands_slot_to_waiter():
+    """Test a released slot goes to the oldest waiter."""
+    async def scenario():
+        controller = AdmissionController(max_in_flight=1, max_queue=1, queue_timeout=1.0)
+        await controller.acquire()
+        waiter = asyncio.create_task(controller.acquire())
+        await asyncio.sleep(0)
+        controller.release()
+        await waiter
+        return controller.in_flight
+    
+    assert asyncio.run(scenario()) == 1
+
+def _make_client(controller, max_body_bytes=1024):
+    app = FastAPI()
+    
+    @app.post("/predict")
+    async def echo(request: Request):
+        return {"size": len(await request.body())}
+    
+    app.add_middleware(AdmissionMiddleware, controller=controller,
+                       max_body_bytes=max_body_bytes, retry_after=2)
+    return TestClient(app)
+
+def test_middleware_rejects_large_upload():
+    """Test uploads above the size limit get 413."""
+    client = _make_client(AdmissionController(), max_body_bytes=16)
+    
+    response = client.post("/predict", content=b"x" * 64)
+    
+    assert response.status_code == 413, "Should reject oversized upload"
+
+def test_middleware_sheds_when_saturated():
+    """Test saturated service returns 503 with Retry-After."""
+    controller = AdmissionController(max_in_flight=1, max_queue=0)
+    controller.in_flight = 1
+    client = _make_client(controller)
+    
+    response = client.post("/predict", content=b"abc")
+    
+    assert response.status_code == 503, "Should shed when saturated"
+    assert response.headers["retry-after"] == "2"
+
+def test_middleware_admits_request():
+    """Test requests within limits pass through and release their slot."""
+    controller = AdmissionController(max_in_flight=1, max_queue=0)
+    client = _make_client(controller)
+    
+    response = client.post("/predict", content=b"abc")
+    
+    assert response.status_code == 200
+    assert response.json()["size"] == 3
+    assert controller.in_flight == 0, "Slot should be released"
@@ -0,0 +1,43 @@
+from src.benchmarking import percentile, latency_summary, compare_reports
+
+def test_percentile_interpolates():
+    """Test percentile interpolation on a sorted list."""
+    values = [1.0, 2.0, 3.0, 4.0, 5.0]
+    
+    assert percentile(values, 0) == 1.0
+    assert percentile(values, 50) == 3.0
+    assert percentile(values, 100) == 5.0
+    assert percentile(values, 25) == 2.0
+
+def test_latency_summary_reports_milliseconds():
+    """Test latency summary converts seconds to millisecond percentiles."""
+    summary = latency_summary([0.01] * 100)
+    
+    assert abs(summary["p50_ms"] - 10.0) < 1e-9
+    assert abs(summary["p999_ms"] - 10.0) < 1e-9
+    assert "mean_ms" in summary
+
+def test_compare_reports_flags_latency_regression():
+    """Test slower latency beyond the threshold is a regression."""
+    baseline = {"metrics": {"p99_ms": 100.0, "rps": 50.0}}
+    current = {"metrics": {"p99_ms": 130.0, "rps": 49.0}}
+    
+    rows = {row["metric"]: row for row in compare_reports(current, baseline, {"p99_ms": 0.2, "rps": 0.1})}
+    
+    assert rows["p99_ms"]["regression"], "30% slower p99 should regress at 20% threshold"
+    assert not rows["rps"]["regression"], "2% lower throughput is within threshold"
+
+def test_compare_reports_throughput_drop():
+    """Test lower throughput is treated as the bad direction."""
+    baseline = {"metrics": {"rps": 50.0}}
+    current = {"metrics": {"rps": 30.0}}
+    
+    rows = compare_reports(current, baseline, {"rps": 0.1})
+    
+    assert rows[0]["regression"], "40% throughput drop should regress"
+
+def test_compare_reports_zero_baseline():
+    """Test new errors against an error-free baseline regress."""
+    rows = compare_reports({"error_rate": 0.05}, {"error_rate": 0.0}, {"error_rate": 0.0})
+    
+    assert rows[0]["regression"]
@@ -0,0 +1,84 @@
+import time
+
+import pytest
+import torch
+import torch.nn as nn
+
+from src.cascade import Cascade, cascade_decisions, sweep_thresholds
+
+class FixedLogits(nn.Module):
+    """Model returning the same logits for every input."""
+    
+    def __init__(self, logits):
+        super().__init__()
+        self.logits = torch.tensor([logits])
+        self.calls = 0
+    
+    def forward(self, x):
+        self.calls += 1
+        return self.logits.expand(x.shape[0], -1)
+
+def test_cascade_answers_confident_images_with_stage1():
+    """Test confident first-stage predictions do not escalate."""
+    stage1, stage2 = FixedLogits([5.0, 0.0]), FixedLogits([0.0, 5.0])
+    cascade = Cascade(stage1, stage2, threshold=0.9)
+    built = []
+    
+    probs, stage = cascade.predict(lambda: torch.zeros(1, 3, 8, 8), lambda: built.append(1))
+    
+    assert stage == "stage1"
+    assert probs.argmax().item() == 0
+    assert stage2.calls == 0 and not built, "Full model input should never be built"
+
+def test_cascade_escalates_uncertain_images():
+    """Test uncertain first-stage predictions use the full model."""
+    stage1, stage2 = FixedLogits([0.1, 0.0]), FixedLogits([0.0, 5.0])
+    cascade = Cascade(stage1, stage2, threshold=0.9)
+    
+    probs, stage = cascade.predict(lambda: torch.zeros(1, 3, 8, 8), lambda: torch.zeros(1, 3, 16, 16))
+    
+    assert stage == "stage2"
+    assert probs.argmax().item() == 1
+
+def test_cascade_times_only_model_calls_as_forward():
+    """Test building a stage's input is not counted as forward time."""
+    from prometheus_client import REGISTRY
+    stage1, stage2 = FixedLogits([0.1, 0.0]), FixedLogits([0.0, 5.0])
+    cascade = Cascade(stage1, stage2, threshold=0.9)
+    labels = {"stage": "forward"}
+    count = REGISTRY.get_sample_value("prediction_stage_latency_seconds_count", labels)
+    total = REGISTRY.get_sample_value("prediction_stage_latency_seconds_sum", labels)
+    
+    def slow_input():
+        time.sleep(0.2)
+        return torch.zeros(1, 3, 8, 8)
+    
+    cascade.predict(slow_input, slow_input)
+    
+    assert REGISTRY.get_sample_value("prediction_stage_latency_seconds_count", labels) == count + 2, \
+        "Each model call should be one forward sample"
+    assert REGISTRY.get_sample_value("prediction_stage_latency_seconds_sum", labels) - total < 0.2, \
+        "Input building should not be timed as forward"
+
+def test_cascade_decisions_vectorized():
+    """Test vectorized decisions pick stage2 only below the threshold."""
+    stage1_probs = torch.tensor([[0.95, 0.05], [0.6, 0.4]])
+    stage2_probs = torch.tensor([[0.1, 0.9], [0.1, 0.9]])
+    
+    predictions, escalated = cascade_decisions(stage1_probs, stage2_probs, 0.9)
+    
+    assert predictions.tolist() == [0, 1]
+    assert escalated.tolist() == [False, True]
+
+def test_sweep_thresholds_cost_tradeoff():
+    """Test higher thresholds escalate more and cost more."""
+    stage1_probs = torch.tensor([[0.95, 0.05], [0.7, 0.3], [0.55, 0.45]])
+    stage2_probs = torch.tensor([[0.9, 0.1], [0.2, 0.8], [0.2, 0.8]])
+    labels = torch.tensor([0, 1, 1])
+    
+    rows = sweep_thresholds(stage1_probs, stage2_probs, labels, [0.5, 0.8, 1.01], stage1_cost=1.0, stage2_cost=10.0)
+    
+    assert [row["escalation_rate"] for row in rows] == pytest.approx([0.0, 2 / 3, 1.0])
+    assert rows[0]["avg_cost_ms"] == 1.0
+    assert rows[-1]["avg_cost_ms"] == 11.0
+    assert rows[-1]["accuracy"] == 100.0
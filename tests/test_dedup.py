@@ -0,0 +1,41 @@
+import io
+
+import numpy as np
+from PIL import Image
+
+from src.dedup import BKTree, find_duplicate_groups, hamming, phash
+
+def _pattern_image(seed, size=224):
+    rng = np.random.RandomState(seed)
+    blocks = rng.randint(0, 256, size=(8, 8, 3), dtype=np.uint8)
+    return Image.fromarray(blocks).resize((size, size), Image.BILINEAR)
+
+def test_phash_survives_resize_and_reencode():
+    """Test a resized, re-encoded copy hashes close to the original."""
+    original = _pattern_image(0)
+    buffer = io.BytesIO()
+    original.resize((150, 150)).save(buffer, "JPEG", quality=70)
+    copy = Image.open(io.BytesIO(buffer.getvalue()))
+    
+    assert hamming(phash(original), phash(copy)) <= 4, "Near-duplicate should be within distance 4"
+    assert hamming(phash(original), phash(_pattern_image(1))) > 10, "Different images should be far apart"
+
+def test_bktree_query_matches_brute_force():
+    """Test BK-tree range queries return the same items as a linear scan."""
+    rng = np.random.RandomState(0)
+    values = [int(v) for v in rng.randint(0, 2 ** 16, size=200)]
+    tree = BKTree()
+    for i, value in enumerate(values):
+        tree.add(value, i)
+    
+    query = values[0] ^ 0b101
+    expected = {i for i, value in enumerate(values) if hamming(query, value) <= 3}
+    assert set(tree.query(query, 3)) == expected
+
+def test_find_duplicate_groups_is_transitive():
+    """Test chained near-duplicates form one group and singletons are dropped."""
+    hashes = {"a": 0b0000, "b": 0b0011, "c": 0b1111, "d": 0b11110000}
+    
+    groups = find_duplicate_groups(hashes, max_distance=2)
+    
+    assert groups == [["a", "b", "c"]], f"Expected one chained group, got {groups}"
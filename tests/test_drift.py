@@ -0,0 +1,97 @@
+import pytest
+import torch
+from torch.utils.data import DataLoader, TensorDataset
+
+from src.drift import (
+    DriftMonitor, Histogram, MODEL_FEATURES, channel_stats, new_sketches, profile_predictions, psi,
+    save_reference_profile, load_reference_profile
+)
+from src.model import get_model
+
+def _profile(values, feature="confidence"):
+    histogram = Histogram(0.0, 1.0, 10)
+    for value in values:
+        histogram.add(value)
+    return {"classes": ["cat", "dog"], "features": {feature: histogram.to_dict()}}
+
+def test_histogram_clamps_out_of_range_values():
+    """Test values outside the range land in the edge bins."""
+    histogram = Histogram(0.0, 1.0, 4)
+    for value in (-5.0, 0.1, 0.5, 0.99, 1.0, 7.0):
+        histogram.add(value)
+    
+    assert histogram.counts == [2, 0, 1, 3], f"Unexpected counts {histogram.counts}"
+
+def test_psi_is_zero_for_same_distribution():
+    """Test PSI is zero for identical histograms and large for a shifted one."""
+    assert psi([10, 20, 30], [1, 2, 3]) == pytest.approx(0.0)
+    assert psi([10, 20, 30], [30, 20, 1]) > 0.25, "A reversed distribution should be significant drift"
+
+def test_drift_monitor_scores_shift():
+    """Test live predictions concentrated away from the reference drift."""
+    reference = [i / 100 for i in range(100)]
+    stable = DriftMonitor(_profile(reference))
+    shifted = DriftMonitor(_profile(reference))
+    for value in reference:
+        stable.observe_prediction(0, value)
+        shifted.observe_prediction(0, 0.55)
+    
+    assert stable.scores()["confidence"] < 0.01
+    assert shifted.scores()["confidence"] > 1.0
+    assert set(stable.scores()) == {"confidence"}, "Only features in the reference should be scored"
+
+def test_drift_monitor_window_keeps_previous():
+    """Test scores cover the previous complete window after it rotates."""
+    monitor = DriftMonitor(_profile([0.5]), window=10)
+    for _ in range(25):
+        monitor.observe_prediction(0, 0.5)
+    
+    assert monitor.samples() == 15, "Expected one full window plus 5 current samples"
+    assert sum(monitor._current["confidence"].counts) == 5
+
+def test_reference_profile_roundtrip(tmp_path):
+    """Test a profile built from a loader can be loaded by the monitor."""
+    loader = DataLoader(TensorDataset(torch.randn(6, 3, 224, 224), torch.zeros(6, dtype=torch.long)), batch_size=4)
+    sketches = profile_predictions(get_model(num_classes=2), loader, "cpu", new_sketches(2))
+    save_reference_profile(tmp_path / "profile.json", sketches, ["cat", "dog"])
+    
+    profile = load_reference_profile(tmp_path / "profile.json")
+    monitor = DriftMonitor(profile)
+    
+    assert sum(profile["features"]["confidence"]["counts"]) == 6
+    assert "resolution" not in profile["features"], "Empty file features should not be saved"
+    assert "channel_std_g" in monitor.reference
+
+def test_channel_stats_subsample_matches_full_tensor():
+    """Test strided channel statistics stay close to those of the whole tensor."""
+    torch.manual_seed(0)
+    inputs = torch.randn(2, 3, 224, 224) * torch.tensor([0.5, 1.0, 1.5]).view(1, 3, 1, 1)
+    means, stds = channel_stats(inputs)
+    
+    full_std, full_mean = torch.std_mean(inputs, dim=(2, 3))
+    assert torch.allclose(torch.tensor(means), full_mean, atol=0.1)
+    assert torch.allclose(torch.tensor(stds), full_std, rtol=0.1)
+
+def test_drift_monitor_excludes_features():
+    """Test excluded features are neither monitored nor scored."""
+    sketches = new_sketches(2)
+    for sketch in sketches.values():
+        sketch.counts[0] = 1
+    profile = {"classes": ["cat", "dog"], "features": {name: s.to_dict() for name, s in sketches.items()}}
+    monitor = DriftMonitor(profile, exclude=MODEL_FEATURES)
+    
+    monitor.observe_channels([0.0] * 3, [1.0] * 3)
+    monitor.observe_prediction(1, 0.99)
+    
+    assert not monitor.observes_channels
+    assert set(monitor.scores()) == {"predicted_class"}
+
+def test_drift_monitor_samples_channels():
+    """Test channel statistics are requested on one call in channel_sample_rate."""
+    profile = {"classes": ["cat", "dog"], "features": {name: s.to_dict() for name, s in new_sketches(2).items()}}
+    monitor = DriftMonitor(profile, channel_sample_rate=4)
+    
+    picks = [monitor.sample_channels() for _ in range(12)]
+    
+    assert picks == [True, False, False, False] * 3
+    assert not DriftMonitor(profile, exclude=MODEL_FEATURES).sample_channels()
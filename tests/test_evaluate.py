@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+import torch
+from PIL import Image
+from torch.utils.data import DataLoader, TensorDataset
+
+from src.evaluate import compute_metrics, evaluate, evaluate_checkpoint, render_figures_async, sample_paths
+from src.model import get_model
+
+def test_compute_metrics_per_class():
+    """Test accuracy, loss and per-class scores from probabilities."""
+    probs = np.array([[0.9, 0.1], [0.2, 0.8], [0.6, 0.4], [0.3, 0.7]])
+    labels = np.array([0, 1, 1, 1])
+    
+    metrics = compute_metrics(probs, labels, np.array([0.1, 0.2, 0.9, 0.3]), ["cat", "dog"])
+    
+    assert metrics["test_accuracy"] == pytest.approx(75.0)
+    assert metrics["test_loss"] == pytest.approx(0.375)
+    assert metrics["test_cat_precision"] == pytest.approx(0.5)
+    assert metrics["test_dog_recall"] == pytest.approx(2 / 3)
+    assert metrics["test_samples"] == 4
+
+def test_evaluate_writes_predictions(tmp_path):
+    """Test evaluate covers every sample and writes one row each to Parquet."""
+    pq = pytest.importorskip("pyarrow.parquet")
+    dataset = TensorDataset(torch.randn(10, 3, 224, 224), torch.tensor([0, 1] * 5))
+    loader = DataLoader(dataset, batch_size=4)
+    
+    evaluation = evaluate(get_model(num_classes=2).eval(), loader, "cpu", ["cat", "dog"], tmp_path)
+    table = pq.read_table(evaluation["predictions_path"])
+    
+    assert table.num_rows == 10, "Every sample should be evaluated, not a capped number of batches"
+    assert {"label", "prediction", "confidence", "loss", "prob_cat", "prob_dog"} <= set(table.column_names)
+    assert sample_paths(dataset) is None
+
+def test_render_figures_in_background(tmp_path):
+    """Test figures are rendered by a background process."""
+    future = render_figures_async(str(tmp_path), np.array([0, 1, 1]), np.array([0, 1, 0]), ["cat", "dog"],
+                                  [0.9, 0.5], [1.0, 0.7])
+    
+    paths = future.result(timeout=120)
+    assert [p.split("/")[-1] for p in paths] == ["confusion_matrix.png", "loss_curves.png"]
+    assert all((tmp_path / name).stat().st_size > 0 for name in ("confusion_matrix.png", "loss_curves.png"))
+
+def test_evaluate_checkpoint_includes_paths(tmp_path):
+    """Test the standalone entry point evaluates an ImageFolder split with file paths."""
+    pq = pytest.importorskip("pyarrow.parquet")
+    model_dir = tmp_path / "model"
+    model_dir.mkdir()
+    torch.save(get_model(num_classes=2, arch="compact").state_dict(), model_dir / "model.pth")
+    (model_dir / "model_config.json").write_text('{"arch": "compact"}')
+    (model_dir / "classes.txt").write_text("cat\ndog")
+    for class_name, color in [('cat', 'red'), ('dog', 'blue')]:
+        (tmp_path / "data" / class_name).mkdir(parents=True)
+        for i in range(10):
+            Image.new('RGB', (32, 32), color=color).save(tmp_path / "data" / class_name / f"{i}.jpg")
+    
+    evaluation = evaluate_checkpoint(str(model_dir), str(tmp_path / "data"), split="train", batch_size=8,
+                                     num_workers=0, log_mlflow=False)
+    table = pq.read_table(evaluation["predictions_path"])
+    
+    assert table.num_rows == 16, "80% of 20 images should be in the train split"
+    assert all(path.endswith(".jpg") for path in table.column("path").to_pylist())
+    assert (model_dir / "evaluation" / "confusion_matrix.png").exists()
@@ -2,10 +2,12 @@ import pytest
 import torch
 from PIL import Image
 import io
+import time
+import numpy as np
 import os
 from fastapi.testclient import TestClient
 
-from src.model import get_model, CatsDogsCNN
+from src.model import get_model, CatsDogsCNN, CompactCatsDogsCNN, save_model_config, load_model_config
 from src.inference import app
 
 # Create dummy model before tests
@@ -43,6 +45,36 @@ def test_model_forward_pass():
     
     assert output.shape == (1, 2), f"Expected output shape (1, 2), got {output.shape}"
 
+def test_compact_model_forward_pass():
+    """Test compact variant output shape at two resolutions."""
+    model = get_model(num_classes=2, arch="compact")
+    model.eval()
+    
+    assert isinstance(model, CompactCatsDogsCNN), "Model should be instance of CompactCatsDogsCNN"
+    with torch.no_grad():
+        assert model(torch.randn(2, 3, 224, 224)).shape == (2, 2)
+        assert model(torch.randn(1, 3, 112, 112)).shape == (1, 2)
+
+def test_compact_model_is_smaller():
+    """Test compact variant has far fewer parameters than the default CNN."""
+    default_params = sum(p.numel() for p in get_model(arch="cnn").parameters())
+    compact_params = sum(p.numel() for p in get_model(arch="compact").parameters())
+    
+    assert compact_params * 50 < default_params, "Compact model should be much smaller"
+
+def test_get_model_unknown_arch():
+    """Test unknown architectures are rejected."""
+    with pytest.raises(ValueError):
+        get_model(arch="resnet9000")
+
+def test_model_config_roundtrip(tmp_path):
+    """Test architecture config is saved and loaded, defaulting to the CNN."""
+    path = tmp_path / "model_config.json"
+    
+    assert load_model_config(path) == {"arch": "cnn"}, "Missing config should default to cnn"
+    save_model_config(path, arch="compact")
+    assert load_model_config(path) == {"arch": "compact"}
+
 def test_health_endpoint():
     """Test health check endpoint."""
     response = client.get("/health")
@@ -88,3 +120,306 @@ def test_predict_endpoint_with_image():
     assert "prediction" in data, "Response should contain prediction"
     assert "confidence" in data, "Response should contain confidence"
     assert "probabilities" in data, "Response should contain probabilities"
+
+def test_rejected_requests_are_logged(monkeypatch):
+    """Test every rejected upload is logged as a prediction error."""
+    import src.inference as inference
+    logged = []
+    monkeypatch.setattr(inference, "log_prediction_error",
+                        lambda error_type, detail, **fields: logged.append((error_type, fields.get("endpoint"))))
+    text_file = {"file": ("test.txt", io.BytesIO(b"not an image"), "text/plain")}
+    
+    client.post("/predict", files=text_file)
+    client.post("/predict/raw", content=b"text", headers={"Content-Type": "text/plain"})
+    client.post("/predict/array", content=b"text", headers={"Content-Type": "text/plain"})
+    client.post("/embed", files=text_file)
+    client.post("/predict/array", content=bytes(100 * 100 * 3), headers={
+        "Content-Type": "application/octet-stream", "X-Array-Shape": "100,100,3"
+    })
+    broken = {"file": ("broken.jpg", io.BytesIO(b"not a jpeg"), "image/jpeg")}
+    client.post("/predict", files=broken)
+    client.post("/predict/raw", content=b"not a jpeg", headers={"Content-Type": "image/jpeg"})
+    client.post("/embed", files={"file": ("broken.jpg", io.BytesIO(b"not a jpeg"), "image/jpeg")})
+    
+    assert logged == [
+        ("invalid_content_type", "/predict"),
+        ("invalid_content_type", "/predict/raw"),
+        ("invalid_content_type", "/predict/array"),
+        ("invalid_content_type", "/embed"),
+        ("decode_error", "/predict/array"),
+        ("decode_error", "/predict"),
+        ("decode_error", "/predict/raw"),
+        ("decode_error", "/embed"),
+    ], "Each rejection should be logged once with its endpoint"
+
+def test_predict_endpoint_with_undecodable_image():
+    """Test prediction endpoint with corrupt image bytes."""
+    files = {"file": ("broken.jpg", io.BytesIO(b"not really a jpeg"), "image/jpeg")}
+    response = client.post("/predict", files=files)
+    
+    assert response.status_code == 400, "Should return 400 for undecodable image"
+
+def test_metrics_endpoint_reports_stage_latency():
+    """Test that per-stage and saturation metrics are exported."""
+    img = Image.new('RGB', (640, 480), color='green')
+    img_byte_arr = io.BytesIO()
+    img.save(img_byte_arr, format='JPEG')
+    img_byte_arr.seek(0)
+    client.post("/predict", files={"file": ("test.jpg", img_byte_arr, "image/jpeg")})
+    
+    response = client.get("/metrics")
+    
+    assert response.status_code == 200, "Metrics endpoint should return 200"
+    body = response.text
+    for stage in ["read", "decode", "transform", "forward", "postprocess"]:
+        assert f'prediction_stage_latency_seconds_count{{stage="{stage}"}}' in body, f"Missing {stage} stage"
+    assert "prediction_requests_in_flight" in body, "Missing in-flight gauge"
+    assert 'prediction_image_resolution_total{bucket="le_1024"}' in body, "Missing resolution bucket"
+    assert "prediction_image_bytes_bucket" in body, "Missing image size histogram"
+
+def _jpeg_bytes(color='red', size=(224, 224)):
+    img_byte_arr = io.BytesIO()
+    Image.new('RGB', size, color=color).save(img_byte_arr, format='JPEG')
+    return img_byte_arr.getvalue()
+
+def test_predict_read_stage_covers_multipart_parsing(monkeypatch):
+    """Test /predict times body receive and form parsing as the read stage."""
+    from prometheus_client import REGISTRY
+    from starlette.requests import Request
+    parse_form = Request.form
+    
+    async def slow_form(self, *args, **kwargs):
+        time.sleep(0.2)
+        return await parse_form(self, *args, **kwargs)
+    monkeypatch.setattr(Request, "form", slow_form)
+    name, labels = "prediction_stage_latency_seconds", {"stage": "read"}
+    count = REGISTRY.get_sample_value(f"{name}_count", labels)
+    total = REGISTRY.get_sample_value(f"{name}_sum", labels)
+    
+    files = {"file": ("test.jpg", io.BytesIO(_jpeg_bytes()), "image/jpeg")}
+    assert client.post("/predict", files=files).status_code == 200
+    
+    assert REGISTRY.get_sample_value(f"{name}_count", labels) == count + 1, "One read sample per request"
+    assert REGISTRY.get_sample_value(f"{name}_sum", labels) - total >= 0.2, "Form parsing should be timed as read"
+
+def test_predict_endpoint_without_file():
+    """Test /predict rejects a form without a file field."""
+    response = client.post("/predict", data={"other": "value"})
+    
+    assert response.status_code == 422, "Missing upload should be rejected"
+
+def test_predict_raw_endpoint():
+    """Test raw body prediction endpoint."""
+    response = client.post("/predict/raw", content=_jpeg_bytes(), headers={"Content-Type": "image/jpeg"})
+    
+    assert response.status_code == 200, "Should return 200 for raw image body"
+    assert "prediction" in response.json(), "Response should contain prediction"
+
+def test_predict_raw_endpoint_binary_response():
+    """Test raw endpoint returns float32 probabilities when asked for binary."""
+    response = client.post("/predict/raw", content=_jpeg_bytes(), headers={
+        "Content-Type": "image/jpeg", "Accept": "application/octet-stream"
+    })
+    
+    assert response.status_code == 200
+    probs = np.frombuffer(response.content, dtype="<f4")
+    assert probs.shape == (2,), "Should return one probability per class"
+    assert response.headers["x-prediction"] in ["cat", "dog"]
+
+def test_predict_array_endpoint_matches_image_endpoint():
+    """Test pre-decoded array input gives the same result as the image path."""
+    img = Image.new('RGB', (224, 224), color='blue')
+    png = io.BytesIO()
+    img.save(png, format='PNG')
+    array = np.asarray(img, dtype=np.uint8)
+    
+    image_response = client.post("/predict/raw", content=png.getvalue(), headers={"Content-Type": "image/png"})
+    array_response = client.post("/predict/array", content=array.tobytes(), headers={
+        "Content-Type": "application/octet-stream", "X-Array-Shape": "224,224,3"
+    })
+    
+    assert array_response.status_code == 200, "Should return 200 for raw array"
+    expected = image_response.json()["probabilities"]
+    for name, prob in array_response.json()["probabilities"].items():
+        assert abs(prob - expected[name]) < 1e-4, "Array and image paths should agree"
+
+def test_predict_array_endpoint_with_npy():
+    """Test .npy array input and msgpack response."""
+    msgpack = pytest.importorskip("msgpack")
+    npy = io.BytesIO()
+    np.save(npy, np.zeros((224, 224, 3), dtype=np.uint8))
+    
+    response = client.post("/predict/array", content=npy.getvalue(), headers={
+        "Content-Type": "application/x-npy", "Accept": "application/msgpack"
+    })
+    
+    assert response.status_code == 200
+    assert "prediction" in msgpack.unpackb(response.content)
+
+def test_predict_array_endpoint_rejects_wrong_shape():
+    """Test arrays that are not 224x224x3 are rejected."""
+    response = client.post("/predict/array", content=bytes(100 * 100 * 3), headers={
+        "Content-Type": "application/octet-stream", "X-Array-Shape": "100,100,3"
+    })
+    
+    assert response.status_code == 400, "Should reject wrongly shaped array"
+
+def test_predict_array_endpoint_rejects_npz():
+    """Test .npz archives are rejected with a 400 instead of failing."""
+    npz = io.BytesIO()
+    np.savez(npz, image=np.zeros((224, 224, 3), dtype=np.uint8))
+    
+    response = client.post("/predict/array", content=npz.getvalue(), headers={"Content-Type": "application/x-npy"})
+    
+    assert response.status_code == 400, "Should reject an .npz archive"
+    assert ".npz" in response.json()["detail"]
+
+def test_embed_endpoint_returns_unit_vector():
+    """Test /embed returns a normalized fc1 embedding."""
+    files = {"file": ("test.jpg", io.BytesIO(_jpeg_bytes()), "image/jpeg")}
+    response = client.post("/embed", files=files)
+    
+    assert response.status_code == 200
+    data = response.json()
+    assert data["dim"] == 512, "CatsDogsCNN embeddings should be 512-d"
+    assert np.linalg.norm(data["embedding"]) == pytest.approx(1.0, abs=1e-4), "Embedding should be unit length"
+
+def test_embed_endpoint_errors_are_logged(monkeypatch):
+    """Test /embed decode and model failures go through the prediction error path."""
+    import src.inference as inference
+    logged = []
+    monkeypatch.setattr(inference, "log_prediction_error",
+                        lambda error_type, detail, **fields: logged.append((error_type, fields.get("endpoint"))))
+    
+    files = {"file": ("test.jpg", io.BytesIO(b"not a jpeg"), "image/jpeg")}
+    assert client.post("/embed", files=files).status_code == 400
+    
+    def fail(inputs):
+        raise RuntimeError("boom")
+    monkeypatch.setattr(inference.model, "embed", fail)
+    files = {"file": ("test.jpg", io.BytesIO(_jpeg_bytes()), "image/jpeg")}
+    assert client.post("/embed", files=files).status_code == 500
+    
+    assert logged == [("decode_error", "/embed"), ("inference_error", "/embed")]
+
+def test_similar_endpoint(tmp_path, monkeypatch):
+    """Test /similar returns the indexed image matching the query first."""
+    import src.inference as inference
+    from src.similarity import EmbeddingIndex, project
+    files = {"file": ("test.jpg", io.BytesIO(_jpeg_bytes()), "image/jpeg")}
+    monkeypatch.setattr(inference, "similarity_index", None)
+    assert client.post("/similar", files=files).status_code == 503, "Should be unavailable without an index"
+    
+    query = inference._embed_image_bytes(_jpeg_bytes(), "/similar")
+    vectors = np.vstack([project(np.random.RandomState(0).rand(3, 512)), project(query)])
+    monkeypatch.setattr(inference, "similarity_index",
+                        EmbeddingIndex(vectors, ["cat/a.jpg", "cat/b.jpg", "dog/c.jpg", "cat/red.jpg"]))
+    
+    files = {"file": ("test.jpg", io.BytesIO(_jpeg_bytes()), "image/jpeg")}
+    response = client.post("/similar?k=2", files=files)
+    
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert len(results) == 2
+    assert results[0]["path"] == "cat/red.jpg", "Exact match should rank first"
+
+def test_profile_endpoint_requires_admin_token(monkeypatch):
+    """Test profiling is hidden without ADMIN_TOKEN and gated by the header."""
+    import src.inference as inference
+    monkeypatch.setattr(inference, "ADMIN_TOKEN", None)
+    assert client.post("/admin/profile?seconds=0.1").status_code == 404, "Should be hidden when disabled"
+    
+    monkeypatch.setattr(inference, "ADMIN_TOKEN", "secret")
+    assert client.post("/admin/profile?seconds=0.1", headers={"X-Admin-Token": "wrong"}).status_code == 403
+    
+    response = client.post("/admin/profile?seconds=0.1&output=folded", headers={"X-Admin-Token": "secret"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+
+def test_metrics_endpoint_reports_drift(monkeypatch):
+    """Test drift scores are published once a reference profile is loaded."""
+    import src.inference as inference
+    from src.drift import DriftMonitor, Histogram
+    profile = {"classes": ["cat", "dog"], "features": {
+        "confidence": Histogram(0.0, 1.0, 10, [0] * 9 + [10]).to_dict(),
+        "resolution": Histogram(4.0, 14.0, 20, [0] * 19 + [10]).to_dict(),
+    }}
+    monkeypatch.setattr(inference, "drift_monitor", DriftMonitor(profile))
+    
+    files = {"file": ("test.jpg", io.BytesIO(_jpeg_bytes()), "image/jpeg")}
+    assert client.post("/predict", files=files).status_code == 200
+    metrics = client.get("/metrics").text
+    
+    assert 'input_drift_psi{feature="confidence"}' in metrics
+    assert 'input_drift_psi{feature="resolution"}' in metrics
+    assert "input_drift_window_samples 1.0" in metrics
+
+def test_only_predictions_feed_the_drift_monitor(monkeypatch):
+    """Test /embed and /similar uploads are left out of drift and upload metrics."""
+    import src.inference as inference
+    observed = []
+    monkeypatch.setattr(inference, "observe_image", lambda *args: observed.append(args))
+    monkeypatch.setattr(inference, "similarity_index", None)
+    
+    files = {"file": ("test.jpg", io.BytesIO(_jpeg_bytes()), "image/jpeg")}
+    assert client.post("/embed", files=files).status_code == 200
+    files = {"file": ("test.jpg", io.BytesIO(_jpeg_bytes()), "image/jpeg")}
+    client.post("/similar", files=files)
+    assert observed == [], "Embedding uploads should not be observed"
+    
+    files = {"file": ("test.jpg", io.BytesIO(_jpeg_bytes()), "image/jpeg")}
+    assert client.post("/predict", files=files).status_code == 200
+    assert len(observed) == 1, "Prediction uploads should be observed"
+
+def test_cascade_drift_ignores_stage1_confidence_and_channels(tmp_path, monkeypatch):
+    """Test enabling the cascade alone does not look like drift."""
+    import json
+    import src.inference as inference
+    from src.cascade import Cascade
+    from src.data_preprocessing import get_transforms
+    from src.drift import new_sketches
+    sketches = new_sketches(2)
+    for sketch in sketches.values():
+        sketch.counts[0] = 10
+    with open(tmp_path / "reference_profile.json", "w") as f:
+        json.dump({"classes": ["cat", "dog"], "features": {name: s.to_dict() for name, s in sketches.items()}}, f)
+    
+    stage1 = CompactCatsDogsCNN(num_classes=2).eval()
+    monkeypatch.setattr(inference, "cascade", Cascade(stage1, inference.model, threshold=0.0))
+    monkeypatch.setattr(inference, "cascade_transform", get_transforms(augment=False, image_size=(112, 112)))
+    monkeypatch.setattr(inference, "cascade_image_size", (112, 112))
+    monkeypatch.setattr(inference, "drift_monitor", None)
+    inference.load_drift_monitor(tmp_path)
+    
+    files = {"file": ("test.jpg", io.BytesIO(_jpeg_bytes()), "image/jpeg")}
+    assert client.post("/predict", files=files).status_code == 200
+    scores = inference.drift_monitor.scores()
+    
+    assert "confidence" not in scores, "Stage1 confidence is always above the threshold"
+    assert not any(name.startswith("channel_") for name in scores), "Stage1 inputs are downsampled"
+    assert {"predicted_class", "resolution", "image_bytes"} <= set(scores)
+
+def test_model_is_served_at_its_configured_image_size(tmp_path, monkeypatch):
+    """Test a model trained at 112x112 gets 112x112 inputs on every path."""
+    import src.inference as inference
+    for name in ("model", "classes", "device", "transform", "image_size", "cascade", "cascade_transform",
+                 "cascade_image_size", "drift_monitor", "similarity_index"):
+        monkeypatch.setattr(inference, name, getattr(inference, name))
+    torch.save(get_model(num_classes=2, arch="compact").state_dict(), tmp_path / "model.pth")
+    save_model_config(tmp_path / "model_config.json", arch="compact", image_size=[112, 112])
+    monkeypatch.setenv("MODEL_DIR", str(tmp_path))
+    monkeypatch.setenv("CASCADE_ENABLED", "0")
+    monkeypatch.setenv("SIMILARITY_INDEX_DIR", str(tmp_path / "similarity"))
+    inference.load_model()
+    
+    assert inference.transform(Image.new('RGB', (300, 200))).shape == (3, 112, 112)
+    files = {"file": ("test.jpg", io.BytesIO(_jpeg_bytes()), "image/jpeg")}
+    assert client.post("/predict", files=files).status_code == 200
+    small = client.post("/predict/array", content=bytes(112 * 112 * 3), headers={
+        "Content-Type": "application/octet-stream", "X-Array-Shape": "112,112,3"
+    })
+    assert small.status_code == 200, "Arrays at the model's size should be accepted"
+    full = client.post("/predict/array", content=bytes(224 * 224 * 3), headers={
+        "Content-Type": "application/octet-stream", "X-Array-Shape": "224,224,3"
+    })
+    assert full.status_code == 400, "Arrays at another size should be rejected"
@@ -0,0 +1,70 @@
+from prometheus_client import REGISTRY
+from prometheus_client.metrics import MetricWrapperBase
+
+from src import metrics
+from src.metrics import resolution_bucket, stage_timer, record_error, ERROR_COUNT
+
+def _samples():
+    """Current value of every sample of every metric defined in src.metrics."""
+    collectors = [value for value in vars(metrics).values() if isinstance(value, MetricWrapperBase)]
+    return {(sample.name, tuple(sorted(sample.labels.items()))): sample.value
+            for collector in collectors for family in collector.collect() for sample in family.samples}
+
+def test_resolution_bucket():
+    """Test images map to bounded resolution buckets."""
+    assert resolution_bucket(100, 80) == "le_128"
+    assert resolution_bucket(224, 224) == "le_256"
+    assert resolution_bucket(640, 1024) == "le_1024"
+    assert resolution_bucket(5000, 10) == "gt_2048"
+
+def test_stage_timer_is_context_manager():
+    """Test stage timer observes one latency sample for its stage."""
+    name = "prediction_stage_latency_seconds_count"
+    before = REGISTRY.get_sample_value(name, {"stage": "forward"})
+    other_before = REGISTRY.get_sample_value(name, {"stage": "decode"})
+    with stage_timer("forward"):
+        sum(range(10))
+    
+    assert REGISTRY.get_sample_value(name, {"stage": "forward"}) == before + 1, "Forward stage should be timed"
+    assert REGISTRY.get_sample_value(name, {"stage": "decode"}) == other_before, "Other stages should be untouched"
+
+def test_record_error_increments_counter():
+    """Test error counter increments per error type."""
+    before = ERROR_COUNT.labels(error_type="decode_error")._value.get()
+    record_error("decode_error")
+    after = ERROR_COUNT.labels(error_type="decode_error")._value.get()
+    
+    assert after == before + 1, "Error counter should increment"
+
+def test_disabled_metrics_are_untouched(monkeypatch):
+    """Test METRICS_ENABLED=0 makes every helper a no-op."""
+    monkeypatch.setattr(metrics, "METRICS_ENABLED", False)
+    before = _samples()
+    
+    for stage in metrics.STAGES:
+        with metrics.stage_timer(stage):
+            pass
+    with metrics.track_in_flight():
+        pass
+    metrics.record_request()
+    metrics.record_prediction("cat", 0.01)
+    for error_type in metrics.ERROR_TYPES:
+        metrics.record_error(error_type)
+    metrics.observe_image(50000, 640, 480)
+    for reason in metrics.SHED_REASONS:
+        metrics.record_shed(reason)
+    metrics.set_queue_depth(7)
+    metrics.record_log_drop()
+    for stage in ("stage1", "stage2"):
+        with metrics.cascade_stage_timer(stage):
+            pass
+    for outcome in metrics.CASCADE_OUTCOMES:
+        metrics.record_cascade_outcome(outcome)
+    metrics.record_index_load(1.5, 100)
+    with metrics.similarity_query_timer():
+        pass
+    metrics.set_drift_scores({"confidence": 0.3}, 10)
+    
+    after = _samples()
+    changed = sorted(key for key in after if after[key] != before.get(key))
+    assert not changed, f"Disabled metrics should not change, got {changed}"
@@ -0,0 +1,41 @@
+import json
+import logging
+import queue
+
+from src.metrics import LOG_RECORDS_DROPPED
+from src.prediction_logging import DroppingQueueHandler, JsonFormatter, PredictionSampler
+
+def test_sampler_always_logs_low_confidence():
+    """Test low-confidence predictions bypass sampling."""
+    sampler = PredictionSampler(sample_rate=0.0, low_confidence=0.6)
+    
+    assert sampler.should_log(0.55), "Low confidence should always be logged"
+    assert not sampler.should_log(0.99), "Confident prediction should be sampled out"
+
+def test_sampler_rate_one_logs_everything():
+    """Test a sample rate of 1 logs every prediction."""
+    sampler = PredictionSampler(sample_rate=1.0, low_confidence=0.0)
+    
+    assert all(sampler.should_log(0.99) for _ in range(100))
+
+def test_json_formatter_includes_fields():
+    """Test records are formatted as JSON with structured fields."""
+    record = logging.LogRecord("prediction", logging.INFO, __file__, 1, "prediction", None, None)
+    record.fields = {"prediction": "cat", "confidence": 0.9}
+    
+    entry = json.loads(JsonFormatter().format(record))
+    
+    assert entry["message"] == "prediction"
+    assert entry["prediction"] == "cat"
+    assert entry["confidence"] == 0.9
+
+def test_queue_handler_drops_when_full():
+    """Test full log queue drops records without blocking."""
+    handler = DroppingQueueHandler(queue.Queue(maxsize=1))
+    record = logging.LogRecord("prediction", logging.INFO, __file__, 1, "prediction", None, None)
+    before = LOG_RECORDS_DROPPED._value.get()
+    
+    handler.emit(record)
+    handler.emit(record)
+    
+    assert LOG_RECORDS_DROPPED._value.get() == before + 1, "Second record should be dropped"
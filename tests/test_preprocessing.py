@@ -6,7 +6,9 @@ from pathlib import Path
 import tempfile
 import os
 
-from src.data_preprocessing import preprocess_image, get_transforms
+from src.data_preprocessing import (
+    preprocess_image, get_transforms, array_to_tensor, prepare_dataloaders, ShardedImageDataset
+)
 
 def test_preprocess_image():
     """Test image preprocessing to target size."""
@@ -63,3 +65,83 @@ def test_transform_normalization():
     # Check that values are normalized (not in 0-255 range)
     assert tensor.max() <= 3.0, "Values should be normalized"
     assert tensor.min() >= -3.0, "Values should be normalized"
+
+def test_array_to_tensor_matches_transform():
+    """Test uint8 array normalization matches the PIL transform."""
+    array = np.random.RandomState(0).randint(0, 256, size=(224, 224, 3), dtype=np.uint8)
+    expected = get_transforms(augment=False)(Image.fromarray(array))
+    
+    tensor = array_to_tensor(array)
+    
+    assert tensor.shape == (3, 224, 224), f"Expected shape (3, 224, 224), got {tensor.shape}"
+    assert torch.allclose(tensor, expected, atol=1e-5), "Array path should match transform"
+
+def _make_image_folder(root, per_class=12):
+    for class_name, color in [('cat', 'red'), ('dog', 'blue')]:
+        (root / class_name).mkdir(parents=True)
+        for i in range(per_class):
+            Image.new('RGB', (32, 32), color=color).save(root / class_name / f"{i}.jpg")
+
+def test_pack_shards_writes_index(tmp_path):
+    """Test packing images into shards records classes and one split per shard."""
+    from prepare_data import pack_shards
+    _make_image_folder(tmp_path / "processed")
+    
+    index = pack_shards(tmp_path / "processed", tmp_path / "shards", shard_size=5)
+    
+    assert index["classes"] == ["cat", "dog"]
+    assert sum(shard["count"] for shard in index["shards"]) == 24
+    assert all(shard["count"] <= 5 for shard in index["shards"]), "Shards should respect shard_size"
+    assert all(shard["name"].startswith(shard["split"]) for shard in index["shards"])
+    assert (tmp_path / "shards" / "train-000000.tar").exists()
+
+def test_sharded_dataset_yields_each_sample_once(tmp_path):
+    """Test splits are disjoint, complete and match the index lengths."""
+    from prepare_data import pack_shards
+    _make_image_folder(tmp_path / "processed")
+    pack_shards(tmp_path / "processed", tmp_path / "shards", shard_size=5)
+    
+    total = 0
+    for split in ["train", "val", "test"]:
+        dataset = ShardedImageDataset(tmp_path / "shards", split, transform=get_transforms(augment=False),
+                                      shuffle_buffer=4)
+        samples = list(dataset)
+        assert len(samples) == len(dataset), f"{split} length should match index"
+        total += len(samples)
+        for tensor, label in samples:
+            assert tensor.shape == (3, 224, 224)
+            assert label in (0, 1)
+    
+    assert total == 24, "Every image should land in exactly one split"
+
+def test_prepare_dataloaders_accepts_shards(tmp_path):
+    """Test prepare_dataloaders detects a sharded layout."""
+    from prepare_data import pack_shards
+    _make_image_folder(tmp_path / "processed")
+    pack_shards(tmp_path / "processed", tmp_path / "shards", shard_size=5)
+    
+    train_loader, val_loader, test_loader, classes = prepare_dataloaders(tmp_path / "shards", batch_size=4)
+    
+    assert classes == ["cat", "dog"]
+    assert isinstance(train_loader.dataset, ShardedImageDataset)
+    assert len(train_loader.dataset) + len(val_loader.dataset) + len(test_loader.dataset) == 24
+
+def test_groups_stay_in_one_split(tmp_path):
+    """Test a duplicate group from groups.json never spans two splits."""
+    import json
+    from prepare_data import pack_shards
+    _make_image_folder(tmp_path / "processed")
+    group = [f"cat/{i}.jpg" for i in range(12)] + [f"dog/{i}.jpg" for i in range(6)]
+    with open(tmp_path / "processed" / "groups.json", "w") as f:
+        json.dump({name: group[0] for name in group}, f)
+    
+    train_loader, val_loader, test_loader, _ = prepare_dataloaders(tmp_path / "processed", batch_size=4)
+    samples = train_loader.dataset.dataset.samples
+    group_indices = {i for i, (path, _) in enumerate(samples)
+                     if Path(path).relative_to(tmp_path / "processed").as_posix() in group}
+    grouped = [len(set(loader.dataset.indices) & group_indices) for loader in (train_loader, val_loader, test_loader)]
+    assert sorted(grouped) == [0, 0, 18], "Grouped images should all share one split"
+    
+    index = pack_shards(tmp_path / "processed", tmp_path / "shards", shard_size=100)
+    counts = sorted(shard["count"] for shard in index["shards"])
+    assert counts[-1] >= 18, "The whole group should be packed into one split"
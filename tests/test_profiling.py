@@ -0,0 +1,113 @@
+import threading
+import time
+
+import pytest
+import torch
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from src.profiling import Profiler, ProfileSession, ProfilingMiddleware, StackSampler
+
+def _busy_loop(stop):
+    while not stop.is_set():
+        sum(range(1000))
+
+def test_stack_sampler_sees_other_threads():
+    """Test folded stacks include functions running in another thread."""
+    stop = threading.Event()
+    worker = threading.Thread(target=_busy_loop, args=(stop,), name="busy")
+    worker.start()
+    sampler = StackSampler(interval=0.001)
+    sampler.start()
+    time.sleep(0.1)
+    sampler.stop()
+    stop.set()
+    worker.join()
+    
+    folded = sampler.folded()
+    assert sampler.samples > 0
+    assert any(line.startswith("busy;") and "_busy_loop" in line for line in folded.splitlines())
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in folded.splitlines()), "Lines should end in a count"
+
+def _profiled_app(profiler):
+    app = FastAPI()
+    app.add_middleware(ProfilingMiddleware, profiler=profiler, paths=("/work",))
+    
+    def convolve():
+        with torch.no_grad():
+            torch.nn.functional.conv2d(torch.randn(1, 3, 32, 32), torch.randn(8, 3, 3, 3))
+    
+    @app.get("/work")
+    async def work():
+        await profiler.run(convolve)
+        return {}
+    
+    @app.get("/health")
+    async def health():
+        return {"status": "healthy"}
+    
+    @app.get("/profile")
+    async def profile(requests: int):
+        session = await profiler.capture(max_requests=requests, seconds=10)
+        return {**session.summary(), "trace": session.chrome_trace()}
+    
+    return app
+
+@pytest.mark.parametrize("all_threads", [True, False])
+def test_capture_stops_after_n_requests(all_threads, monkeypatch):
+    """Test a capture ends after N guarded requests and traces the model ops run in worker threads."""
+    if not all_threads:
+        def no_all_threads(**kwargs):
+            raise TypeError("profile_all_threads is not supported")
+        monkeypatch.setattr(torch._C._profiler, "_ExperimentalConfig", no_all_threads)
+    profiler = Profiler()
+    result = {}
+    with TestClient(_profiled_app(profiler)) as client:
+        capture = threading.Thread(target=lambda: result.update(client.get("/profile?requests=3").json()))
+        capture.start()
+        while profiler.session is None:
+            time.sleep(0.01)
+        for _ in range(3):
+            client.get("/work")
+        capture.join(timeout=10)
+    
+    assert result["requests"] == 3
+    assert result["duration_seconds"] < 10, "Capture should end on the request count, not the timeout"
+    assert profiler.session is None, "Session should be cleared after the capture"
+    names = {event.get("name") for event in result["trace"]["traceEvents"]}
+    assert "aten::conv2d" in names, "Ops run in worker threads should be traced"
+
+def _answers_quickly(client, path):
+    start = time.perf_counter()
+    response = client.get(path)
+    return response.status_code == 200 and time.perf_counter() - start < 0.3
+
+def test_health_answers_while_capture_starts_and_stops(monkeypatch):
+    """Test starting and stopping a capture never blocks the event loop."""
+    starting, stopping = threading.Event(), threading.Event()
+    start, stop = ProfileSession.start, ProfileSession.stop
+    
+    def slow_start(self):
+        starting.set()
+        time.sleep(0.6)
+        start(self)
+    
+    def slow_stop(self):
+        stopping.set()
+        time.sleep(0.6)
+        stop(self)
+    
+    monkeypatch.setattr(ProfileSession, "start", slow_start)
+    monkeypatch.setattr(ProfileSession, "stop", slow_stop)
+    profiler = Profiler()
+    with TestClient(_profiled_app(profiler)) as client:
+        capture = threading.Thread(target=lambda: client.get("/profile?requests=1"))
+        capture.start()
+        assert starting.wait(5)
+        assert _answers_quickly(client, "/health"), "Health should answer while the capture starts"
+        while profiler.session is None:
+            time.sleep(0.01)
+        client.get("/work")
+        assert stopping.wait(5)
+        assert _answers_quickly(client, "/health"), "Health should answer while the capture stops"
+        capture.join(timeout=10)
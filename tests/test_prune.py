@@ -0,0 +1,65 @@
+import pytest
+import torch
+
+from src.model import get_model, load_checkpoint, save_model_config
+from src.prune import cnn_cost, keep_fraction_for_target, prune_cnn, prune_model
+
+def test_prune_keep_all_is_identical():
+    """Test pruning with keep=1 rebuilds an equivalent model."""
+    model = get_model(num_classes=2).eval()
+    pruned = prune_cnn(model, keep=1.0).eval()
+    inputs = torch.randn(2, 3, 224, 224)
+    
+    with torch.no_grad():
+        assert torch.allclose(model(inputs), pruned(inputs), atol=1e-5)
+
+def test_prune_builds_smaller_dense_model():
+    """Test pruned model is physically smaller and still runs."""
+    model = get_model(num_classes=2).eval()
+    pruned = prune_cnn(model, keep=0.5).eval()
+    
+    assert pruned.channels == (16, 32, 64)
+    assert pruned.hidden == 256
+    assert pruned.fc1.in_features == 64 * 28 * 28
+    with torch.no_grad():
+        assert pruned(torch.randn(1, 3, 224, 224)).shape == (1, 2)
+
+def test_cnn_cost_matches_parameter_count():
+    """Test analytical parameter count matches the real model."""
+    model = get_model(num_classes=2, channels=(8, 16, 24), hidden=32)
+    
+    assert cnn_cost((8, 16, 24), 32, metric="params") == sum(p.numel() for p in model.parameters())
+
+@pytest.mark.parametrize("metric", ["flops", "params"])
+def test_keep_fraction_hits_target(metric):
+    """Test chosen keep fraction meets the target cost ratio."""
+    keep = keep_fraction_for_target((32, 64, 128), 512, 0.25, metric)
+    widths = tuple(max(1, round(c * keep)) for c in (32, 64, 128))
+    hidden = max(1, round(512 * keep))
+    
+    ratio = cnn_cost(widths, hidden, metric=metric) / cnn_cost((32, 64, 128), 512, metric=metric)
+    assert 0.15 < ratio <= 0.25
+
+def test_prune_rejects_other_architectures():
+    """Test pruning only supports the default CNN."""
+    with pytest.raises(ValueError):
+        prune_cnn(get_model(arch="compact"), keep=0.5)
+
+def test_prune_model_output_loads(tmp_path, monkeypatch):
+    """Test prune_model writes a checkpoint that load_checkpoint can load and run."""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("MLFLOW_TRACKING_URI", "sqlite:///mlflow.db")
+    model_dir, output_dir = tmp_path / "model", tmp_path / "pruned"
+    model_dir.mkdir()
+    torch.save(get_model(num_classes=2, channels=(8, 16, 24), hidden=32).state_dict(), model_dir / "model.pth")
+    save_model_config(model_dir / "model_config.json", channels=[8, 16, 24], hidden=32)
+    (model_dir / "classes.txt").write_text("cat\ndog\n")
+    
+    pruned, _, _ = prune_model(model_dir, output_dir, target=0.5, metric="params", data_dir=tmp_path / "missing")
+    loaded, image_size = load_checkpoint(output_dir, num_classes=2)
+    
+    assert (output_dir / "classes.txt").read_text() == "cat\ndog\n", "Classes should be copied"
+    assert loaded.channels == pruned.channels and loaded.hidden == pruned.hidden
+    inputs = torch.randn(1, 3, *image_size)
+    with torch.no_grad():
+        assert torch.allclose(loaded(inputs), pruned(inputs), atol=1e-5), "Loaded model should match the pruned one"
@@ -0,0 +1,100 @@
+import numpy as np
+import pytest
+import torch
+from PIL import Image
+
+from src.similarity import EmbeddingIndex, fit_pca, project, quantize_int8
+
+def _brute_force(vectors, query, k):
+    scores = project(vectors) @ project(query[None])[0]
+    return list(np.argsort(-scores)[:k])
+
+def test_search_matches_brute_force_across_chunks():
+    """Test chunked top-k equals a full sort over all scores."""
+    rng = np.random.RandomState(0)
+    raw = rng.randn(1000, 32).astype(np.float32)
+    paths = [str(i) for i in range(1000)]
+    index = EmbeddingIndex(project(raw), paths, chunk_size=128)
+    query = rng.randn(32)
+    
+    results = index.search(query, k=10)[0]
+    
+    assert [int(path) for path, _ in results] == _brute_force(raw, query, 10)
+    scores = [score for _, score in results]
+    assert scores == sorted(scores, reverse=True), "Results should be ordered best first"
+
+def test_int8_index_keeps_top_result():
+    """Test int8 quantization preserves the nearest neighbour."""
+    rng = np.random.RandomState(1)
+    vectors = project(rng.randn(500, 64))
+    values, scales = quantize_int8(vectors)
+    index = EmbeddingIndex(values, [str(i) for i in range(500)], scales=scales)
+    
+    path, score = index.search(vectors[42], k=1)[0][0]
+    
+    assert path == "42"
+    assert score == pytest.approx(1.0, abs=0.01), "Dequantized self-similarity should be close to 1"
+
+class _SliceRecorder:
+    """Wrap a matrix and record the number of rows of every slice taken from it."""
+    
+    def __init__(self, array):
+        self.array = array
+        self.rows = []
+    
+    def __len__(self):
+        return len(self.array)
+    
+    def __getitem__(self, item):
+        block = self.array[item]
+        self.rows.append(len(block))
+        return block
+
+def test_int8_search_uses_small_chunks(monkeypatch):
+    """Test int8 search dequantizes bounded chunks and matches a single-chunk search."""
+    import src.similarity as similarity
+    rng = np.random.RandomState(3)
+    values, scales = quantize_int8(project(rng.randn(1000, 32)))
+    paths = [str(i) for i in range(1000)]
+    query = rng.randn(32)
+    expected = EmbeddingIndex(values, paths, scales=scales).search(query, k=5)
+    monkeypatch.setattr(similarity, "INT8_CHUNK_SIZE", 64)
+    recorder = _SliceRecorder(values)
+    
+    assert EmbeddingIndex(recorder, paths, scales=scales).search(query, k=5) == expected, \
+        "Chunking should not change results"
+    assert max(recorder.rows) == 64, "int8 search should dequantize at most INT8_CHUNK_SIZE rows at once"
+
+def test_pca_projection_reduces_dimension():
+    """Test PCA-compressed queries are searched in the reduced space."""
+    rng = np.random.RandomState(2)
+    vectors = project(rng.randn(200, 64))
+    mean, components = fit_pca(vectors, 16)
+    index = EmbeddingIndex(project(vectors, mean, components), [str(i) for i in range(200)],
+                           pca_mean=mean, pca_components=components)
+    
+    assert index.dim == 16
+    assert index.search(vectors[7], k=1)[0][0][0] == "7"
+    with pytest.raises(ValueError):
+        fit_pca(vectors, 64)
+
+def test_build_index_roundtrip(tmp_path):
+    """Test build_index writes an index that load() can search."""
+    from src.build_index import build_index
+    from src.model import get_model
+    model_dir = tmp_path / "model"
+    model_dir.mkdir()
+    torch.save(get_model(num_classes=2, arch="compact").state_dict(), model_dir / "model.pth")
+    (model_dir / "model_config.json").write_text('{"arch": "compact"}')
+    for class_name, color in [('cat', 'red'), ('dog', 'blue')]:
+        (tmp_path / "data" / class_name).mkdir(parents=True)
+        for i in range(3):
+            Image.new('RGB', (32, 32), color=color).save(tmp_path / "data" / class_name / f"{i}.jpg")
+    
+    meta = build_index(tmp_path / "data", model_dir, tmp_path / "index", batch_size=4, quantize=True, num_workers=0)
+    index = EmbeddingIndex.load(tmp_path / "index")
+    
+    assert meta["count"] == 6 and meta["dtype"] == "int8"
+    assert index.vectors.dtype == np.int8 and len(index) == 6
+    assert index.paths[0] == "cat/0.jpg"
+    assert not (tmp_path / "index" / "embeddings_raw.npy").exists(), "Temporary matrix should be removed"